@@ -7,6 +7,11 @@ import json
 import sqlite3
 import datetime
 import time
+import queue
+import atexit
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 import telebot
@@ -14,8 +19,13 @@ from telebot import types
 import gspread
 from google.oauth2.service_account import Credentials
 from google.oauth2.credentials import Credentials as UserCredentials
-from google.auth.transport.requests import Request
+from google.auth.transport.requests import Request, AuthorizedSession
+from requests.adapters import HTTPAdapter
 from googleapiclient.discovery import build
+try:
+    import orjson
+except ImportError:
+    orjson = None
 # from ai_service import ai_service  # Temporarily disabled
 
 # Load environment variables
@@ -42,6 +52,11 @@ creds_path = os.getenv('GOOGLE_API_CREDENTIALS_PATH', 'credentials.json')
 oauth_creds_path = os.getenv('GOOGLE_OAUTH_CREDENTIALS_PATH', 'oauth_credentials.json')
 oauth_token_path = os.getenv('GOOGLE_OAUTH_TOKEN_PATH', 'token.json')
 DB_PATH = os.getenv('FOOD_DB_PATH', 'food.db')
+# Webhook mode is used when WEBHOOK_URL is set (public HTTPS URL behind a reverse proxy)
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '127.0.0.1')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
 
 # --- CONFIGURATION ---
 SCOPES = [
@@ -63,7 +78,7 @@ except ValueError:
     SUPER_ADMIN_ID = None
     ADMIN_IDS = []
 
-bot = telebot.TeleBot(token)
+bot = telebot.TeleBot(token, threaded=True, num_threads=8)
 
 # Global variables
 current_sheet_id = None
@@ -74,6 +89,10 @@ TARGET_FOLDER_ID = "1dt-L4A68Wu4KVuydb-zZi8b88sc1L5PH"
 # Global state for batch processing
 user_states = {}
 
+# Cached {reestr_number: row} map of the Registry sheet
+REGISTRY_INDEX_TTL = 60
+_registry_index_cache = {"ts": 0, "map": {}}
+
 # --- GOOGLE SERVICES HELPER ---
 def get_creds():
     # Prefer OAuth user creds if token exists
@@ -95,20 +114,103 @@ def get_creds():
         logging.error(f"Failed to load service account credentials: {e}")
         return None
 
+_gc_cache = None
+
 def get_gc():
+    """
+    Returns a process-wide gspread client. Its AuthorizedSession keeps a
+    connection pool, so TLS connections are reused across Sheets calls
+    and tokens are refreshed transparently.
+    """
+    global _gc_cache
+    if _gc_cache:
+        return _gc_cache
     creds = get_creds()
     if creds:
         try:
-            return gspread.authorize(creds)
+            session = AuthorizedSession(creds)
+            session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+            _gc_cache = gspread.authorize(creds, session=session)
+            return _gc_cache
         except Exception as e:
              logging.error(f"Failed to authorize gspread: {e}")
     return None
 
+_master_sh = None
+
+def get_master_sheet():
+    """
+    Returns the master spreadsheet handle, opened once per process.
+    Token refresh is handled by the client session, so the handle stays valid.
+    """
+    global _master_sh
+    if _master_sh is None:
+        gc = get_gc()
+        if not gc:
+            return None
+        _master_sh = gc.open_by_key(MASTER_SHEET_ID)
+    return _master_sh
+
+# Drive service objects are cached per thread (httplib2 is not thread-safe)
+_drive_local = threading.local()
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: allows bursts of `capacity` calls,
+    then one call per 1/rate seconds.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+# Sheets write quota is ~60 requests/min per user
+GOOGLE_MAX_CONCURRENCY = 6
+GOOGLE_RETRY_STATUSES = (429, 500, 503)
+_google_semaphore = threading.Semaphore(GOOGLE_MAX_CONCURRENCY)
+_google_write_bucket = TokenBucket(rate=1 / 1.1, capacity=GOOGLE_MAX_CONCURRENCY)
+
+def google_write(func, *args, max_retries=5, **kwargs):
+    """
+    Runs a Sheets write call under the shared concurrency/rate limits,
+    retrying 429 and 5xx responses with exponential backoff.
+    """
+    for attempt in range(max_retries):
+        _google_write_bucket.acquire()
+        try:
+            with _google_semaphore:
+                return func(*args, **kwargs)
+        except gspread.exceptions.APIError as e:
+            status = getattr(e.response, "status_code", None)
+            if status not in GOOGLE_RETRY_STATUSES or attempt == max_retries - 1:
+                raise
+            logging.warning(f"Google API {status}, retry {attempt + 1}/{max_retries}")
+            time.sleep(2 ** attempt)
+
 def get_drive_service():
+    service = getattr(_drive_local, "service", None)
+    if service:
+        return service
     creds = get_creds()
     if creds:
         try:
-            return build('drive', 'v3', credentials=creds)
+            service = build('drive', 'v3', credentials=creds)
+            _drive_local.service = service
+            return service
         except Exception as e:
             logging.error(f"Failed to build drive service: {e}")
     return None
@@ -120,25 +222,95 @@ def check_drive_folder_access():
     if not service:
         return False, "Drive service unavailable"
     try:
-        meta = service.files().get(
-            fileId=TARGET_FOLDER_ID,
-            fields="id,name,mimeType"
-        ).execute()
-        if meta.get("mimeType") != "application/vnd.google-apps.folder":
-            return False, "TARGET_FOLDER_ID is not a folder"
-        # Try a lightweight list to confirm access
+        # Listing children fails with 403/404 if the folder is missing or not shared
         service.files().list(
             q=f"'{TARGET_FOLDER_ID}' in parents and trashed=false",
             pageSize=1,
             fields="files(id)"
         ).execute()
-        return True, meta.get("name", "")
+        return True, TARGET_FOLDER_ID
     except Exception as e:
         logging.error(f"Drive folder access check failed: {e}")
         return False, str(e)
 
+# --- JSON HELPERS ---
+def json_loads(raw):
+    """
+    Parses JSON from bytes or str, using orjson when available.
+    """
+    if orjson:
+        return orjson.loads(raw)
+    if isinstance(raw, bytes):
+        raw = raw.decode('utf-8')
+    return json.loads(raw)
+
+def json_dumps(value):
+    if orjson:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    return json.dumps(value, ensure_ascii=False)
+
+# --- BACKGROUND WRITERS ---
+class BackgroundBatchWriter:
+    """
+    Collects items on a queue and passes them to flush(items) in batches
+    from a daemon thread: up to batch_size items or interval seconds each.
+    Pending items are flushed before the interpreter exits.
+    """
+    def __init__(self, name, flush, batch_size, interval):
+        self.name = name
+        self.flush = flush
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._started = False
+
+    def put(self, item):
+        self._ensure_started()
+        self._queue.put(item)
+
+    def join(self):
+        self._queue.join()
+
+    def _ensure_started(self):
+        if self._started:
+            return
+        with self._lock:
+            if not self._started:
+                threading.Thread(target=self._run, name=self.name, daemon=True).start()
+                atexit.register(self.join)
+                self._started = True
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            deadline = time.time() + self.interval
+            while len(items) < self.batch_size:
+                wait = deadline - time.time()
+                if wait <= 0:
+                    break
+                try:
+                    items.append(self._queue.get(timeout=wait))
+                except queue.Empty:
+                    break
+            try:
+                self.flush(items)
+            except Exception as e:
+                logging.warning(f"{self.name}: failed to flush {len(items)} items: {e}")
+            finally:
+                for _ in items:
+                    self._queue.task_done()
+
 # --- SQLITE HELPERS ---
+_db_initialized = False
+
 def init_db():
+    """
+    Creates tables once per process; later calls are no-ops.
+    """
+    global _db_initialized
+    if _db_initialized:
+        return
     conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
     cur.execute("""
@@ -194,8 +366,12 @@ def init_db():
             last_checked TEXT
         )
     """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_checks_reestr ON checks(reestr_number, checked_at DESC)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_objects_history_reestr ON objects_history(reestr_number, changed_at DESC)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_requisites_history_reestr ON requisites_history(reestr_number, changed_at DESC)")
     conn.commit()
     conn.close()
+    _db_initialized = True
 
 def get_last_hashes(reestr_number):
     conn = sqlite3.connect(DB_PATH)
@@ -207,97 +383,143 @@ def get_last_hashes(reestr_number):
         return row[0] or "", row[1] or ""
     return "", ""
 
-def get_last_changed(reestr_number):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("SELECT last_changed FROM contracts WHERE reestr_number = ?", (reestr_number,))
-    row = cur.fetchone()
-    conn.close()
-    if row and row[0]:
-        return row[0]
-    return None
+CONTRACT_TEXT_FIELDS = (
+    "reestr_number", "customer", "price_source", "date_start", "date_end",
+    "url", "objects_hash", "requisites_hash",
+)
+CONTRACT_FLOAT_FIELDS = ("price_clean", "objects_total_clean")
 
-def record_check(data):
-    now = datetime.datetime.utcnow().isoformat()
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO checks (reestr_number, checked_at, price_clean, objects_hash, requisites_hash) VALUES (?, ?, ?, ?, ?)",
-        (
-            data.get("reestr_number", ""),
+def _coerce_parsed(data):
+    """
+    Normalizes a parsed contract payload in place once it enters the pipeline:
+    fills missing text fields with "" and coerces numeric fields to float,
+    so DB helpers below can index keys directly.
+    """
+    for key in CONTRACT_TEXT_FIELDS:
+        if data.get(key) is None:
+            data[key] = ""
+    for key in CONTRACT_FLOAT_FIELDS:
+        value = data.get(key)
+        if not isinstance(value, float):
+            try:
+                data[key] = float(value or 0)
+            except (TypeError, ValueError):
+                data[key] = 0.0
+    if data.get("objects") is None:
+        data["objects"] = []
+    if data.get("requisites") is None:
+        data["requisites"] = {}
+    return data
+
+CHECK_INSERT_SQL = (
+    "INSERT INTO checks (reestr_number, checked_at, price_clean, objects_hash, requisites_hash) "
+    "VALUES (?, ?, ?, ?, ?)"
+)
+CONTRACT_UPSERT_SQL = """
+    INSERT INTO contracts (
+        reestr_number, customer, price_clean, price_source, date_start, date_end, url,
+        objects_hash, requisites_hash, last_checked, last_changed
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(reestr_number) DO UPDATE SET
+        customer=excluded.customer,
+        price_clean=excluded.price_clean,
+        price_source=excluded.price_source,
+        date_start=excluded.date_start,
+        date_end=excluded.date_end,
+        url=excluded.url,
+        objects_hash=excluded.objects_hash,
+        requisites_hash=excluded.requisites_hash,
+        last_checked=excluded.last_checked,
+        last_changed=COALESCE(excluded.last_changed, contracts.last_changed)
+"""
+OBJECTS_HISTORY_INSERT_SQL = (
+    "INSERT INTO objects_history (reestr_number, changed_at, objects_json, objects_hash, objects_total_clean) "
+    "VALUES (?, ?, ?, ?, ?)"
+)
+REQUISITES_HISTORY_INSERT_SQL = (
+    "INSERT INTO requisites_history (reestr_number, changed_at, requisites_json, requisites_hash) "
+    "VALUES (?, ?, ?, ?)"
+)
+
+def write_contract_records(records):
+    """
+    Writes checks, history rows and contract upserts for a batch of
+    (data, objects_changed, requisites_changed, checked_at) in one transaction.
+    """
+    checks = []
+    objects_rows = []
+    requisites_rows = []
+    contracts = []
+    for data, objects_changed, requisites_changed, now in records:
+        checks.append((
+            data["reestr_number"],
             now,
-            float(data.get("price_clean", 0) or 0),
-            data.get("objects_hash", ""),
-            data.get("requisites_hash", "")
-        )
-    )
-    conn.commit()
-    conn.close()
+            data["price_clean"],
+            data["objects_hash"],
+            data["requisites_hash"]
+        ))
+        if objects_changed:
+            objects_rows.append((
+                data["reestr_number"],
+                now,
+                json_dumps(data["objects"]),
+                data["objects_hash"],
+                data["objects_total_clean"],
+            ))
+        if requisites_changed:
+            requisites_rows.append((
+                data["reestr_number"],
+                now,
+                json_dumps(data["requisites"]),
+                data["requisites_hash"],
+            ))
+        # NULL keeps the stored last_changed on conflict (see COALESCE in the upsert)
+        last_changed = now if (objects_changed or requisites_changed) else None
+        contracts.append((
+            data["reestr_number"],
+            data["customer"],
+            data["price_clean"],
+            data["price_source"],
+            data["date_start"],
+            data["date_end"],
+            data["url"],
+            data["objects_hash"],
+            data["requisites_hash"],
+            now,
+            last_changed
+        ))
 
-def upsert_contract(data, objects_changed, requisites_changed):
-    now = datetime.datetime.utcnow().isoformat()
-    last_changed = now if (objects_changed or requisites_changed) else get_last_changed(data.get("reestr_number", ""))
     conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute("""
-        INSERT INTO contracts (
-            reestr_number, customer, price_clean, price_source, date_start, date_end, url,
-            objects_hash, requisites_hash, last_checked, last_changed
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ON CONFLICT(reestr_number) DO UPDATE SET
-            customer=excluded.customer,
-            price_clean=excluded.price_clean,
-            price_source=excluded.price_source,
-            date_start=excluded.date_start,
-            date_end=excluded.date_end,
-            url=excluded.url,
-            objects_hash=excluded.objects_hash,
-            requisites_hash=excluded.requisites_hash,
-            last_checked=excluded.last_checked,
-            last_changed=excluded.last_changed
-    """, (
-        data.get("reestr_number", ""),
-        data.get("customer", ""),
-        float(data.get("price_clean", 0) or 0),
-        data.get("price_source", ""),
-        data.get("date_start", ""),
-        data.get("date_end", ""),
-        data.get("url", ""),
-        data.get("objects_hash", ""),
-        data.get("requisites_hash", ""),
-        now,
-        last_changed
-    ))
-    conn.commit()
+    with conn:
+        conn.executemany(CHECK_INSERT_SQL, checks)
+        if objects_rows:
+            conn.executemany(OBJECTS_HISTORY_INSERT_SQL, objects_rows)
+        if requisites_rows:
+            conn.executemany(REQUISITES_HISTORY_INSERT_SQL, requisites_rows)
+        conn.executemany(CONTRACT_UPSERT_SQL, contracts)
     conn.close()
+    _bump_registry_version()
 
-def record_history(data, objects_changed, requisites_changed):
+_db_writer = BackgroundBatchWriter("db-writer", write_contract_records, batch_size=50, interval=0.2)
+
+def record_contract(data, objects_changed, requisites_changed):
+    """
+    Queues the check, history and contract rows for the background DB writer.
+    """
     now = datetime.datetime.utcnow().isoformat()
+    _db_writer.put((data, objects_changed, requisites_changed, now))
+
+def load_all_hashes():
+    """
+    Loads {reestr_number: (objects_hash, requisites_hash)} for all contracts.
+    Used once per check cycle instead of a SELECT per contract.
+    """
     conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
-    if objects_changed:
-        cur.execute(
-            "INSERT INTO objects_history (reestr_number, changed_at, objects_json, objects_hash, objects_total_clean) VALUES (?, ?, ?, ?, ?)",
-            (
-                data.get("reestr_number", ""),
-                now,
-                json.dumps(data.get("objects", []), ensure_ascii=False),
-                data.get("objects_hash", ""),
-                float(data.get("objects_total_clean", 0) or 0),
-            )
-        )
-    if requisites_changed:
-        cur.execute(
-            "INSERT INTO requisites_history (reestr_number, changed_at, requisites_json, requisites_hash) VALUES (?, ?, ?, ?)",
-            (
-                data.get("reestr_number", ""),
-                now,
-                json.dumps(data.get("requisites", {}), ensure_ascii=False),
-                data.get("requisites_hash", ""),
-            )
-        )
-    conn.commit()
+    cur.execute("SELECT reestr_number, objects_hash, requisites_hash FROM contracts")
+    rows = cur.fetchall()
     conn.close()
+    return {row[0]: (row[1] or "", row[2] or "") for row in rows}
 
 def determine_changes(data):
     last_objects_hash, last_requisites_hash = get_last_hashes(data.get("reestr_number", ""))
@@ -305,23 +527,43 @@ def determine_changes(data):
     requisites_changed = (data.get("requisites_hash", "") != last_requisites_hash)
     return objects_changed, requisites_changed
 
-def get_contract_numbers_from_db():
-    init_db()
+def determine_changes_cached(data, hashes_map):
+    reestr_number = data.get("reestr_number", "")
+    last_objects_hash, last_requisites_hash = hashes_map.get(reestr_number, ("", ""))
+    objects_changed = (data.get("objects_hash", "") != last_objects_hash)
+    requisites_changed = (data.get("requisites_hash", "") != last_requisites_hash)
+    if objects_changed or requisites_changed:
+        hashes_map[reestr_number] = (data.get("objects_hash", ""), data.get("requisites_hash", ""))
+    return objects_changed, requisites_changed
+
+# Bumped by every write to the contracts table; stale cache keys become unreachable
+_registry_version = 0
+
+def _bump_registry_version():
+    global _registry_version
+    _registry_version += 1
+
+@lru_cache(maxsize=4)
+def _load_contract_numbers(version):
     conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
     cur.execute("SELECT reestr_number FROM contracts")
     rows = cur.fetchall()
     conn.close()
-    return [row[0] for row in rows if row and row[0]]
+    return tuple(row[0] for row in rows if row and row[0])
+
+def get_contract_numbers_from_db():
+    return list(_load_contract_numbers(_registry_version))
 
 def get_contract_numbers_from_registry():
     gc = get_gc()
     if not gc:
         return []
     try:
-        sh = gc.open_by_key(MASTER_SHEET_ID)
+        sh = get_master_sheet()
         ws = get_registry_worksheet(sh)
         values = ws.col_values(1)
+        _set_registry_index(values)
         if not values:
             return []
         numbers = []
@@ -334,8 +576,14 @@ def get_contract_numbers_from_registry():
         logging.warning(f"Failed to read registry sheet: {e}")
         return []
 
+def get_contracts_prefer_registry():
+    """
+    Returns contract numbers from the Registry sheet, or from the DB when the
+    sheet is empty or unreachable. The DB read goes through the versioned cache.
+    """
+    return get_contract_numbers_from_registry() or get_contract_numbers_from_db()
+
 def ensure_contract_stub(reestr_number):
-    init_db()
     conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
     cur.execute(
@@ -348,6 +596,7 @@ def ensure_contract_stub(reestr_number):
     )
     conn.commit()
     conn.close()
+    _bump_registry_version()
 
 def add_contracts_to_registry(contract_numbers):
     for number in contract_numbers:
@@ -355,7 +604,8 @@ def add_contracts_to_registry(contract_numbers):
         upsert_registry_row({"reestr_number": number}, False, False)
 
 def remove_contract_from_registry(reestr_number):
-    init_db()
+    # Pending contract upserts must not run after the DELETEs below
+    _db_writer.join()
     conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
     cur.execute("DELETE FROM contracts WHERE reestr_number = ?", (reestr_number,))
@@ -364,23 +614,26 @@ def remove_contract_from_registry(reestr_number):
     cur.execute("DELETE FROM checks WHERE reestr_number = ?", (reestr_number,))
     conn.commit()
     conn.close()
+    _bump_registry_version()
 
+    # A queued registry row written after the delete would bring the contract back
+    _sheets_writer.join()
     gc = get_gc()
     if not gc:
         return
     try:
-        sh = gc.open_by_key(MASTER_SHEET_ID)
+        sh = get_master_sheet()
         ws = get_registry_worksheet(sh)
-        cell = ws.find(reestr_number)
-        if cell:
-            ws.delete_rows(cell.row)
-    except gspread.exceptions.CellNotFound:
-        return
+        row_idx = _get_registry_index(ws).get(reestr_number)
+        if row_idx:
+            ws.delete_rows(row_idx)
+            _invalidate_registry_index()
     except Exception as e:
         logging.warning(f"Failed to remove from registry sheet: {e}")
 
 def clear_registry():
-    init_db()
+    # Pending contract upserts must not run after the DELETEs below
+    _db_writer.join()
     conn = sqlite3.connect(DB_PATH)
     cur = conn.cursor()
     cur.execute("DELETE FROM contracts")
@@ -389,14 +642,18 @@ def clear_registry():
     cur.execute("DELETE FROM checks")
     conn.commit()
     conn.close()
+    _bump_registry_version()
 
+    # Queued registry rows must land before the sheet is cleared
+    _sheets_writer.join()
     gc = get_gc()
     if not gc:
         return
     try:
-        sh = gc.open_by_key(MASTER_SHEET_ID)
+        sh = get_master_sheet()
         ws = get_registry_worksheet(sh)
         ws.resize(rows=1)
+        _invalidate_registry_index()
     except Exception as e:
         logging.warning(f"Failed to clear registry sheet: {e}")
 def safe_send(chat_id, text, **kwargs):
@@ -405,30 +662,115 @@ def safe_send(chat_id, text, **kwargs):
     bot.send_message(chat_id, text, **kwargs)
 
 # --- GOOGLE SHEETS HELPERS ---
-def get_registry_worksheet(sh):
+def _set_registry_index(values):
+    _registry_index_cache["map"] = {
+        v.strip(): i + 1 for i, v in enumerate(values) if v and v.strip()
+    }
+    _registry_index_cache["ts"] = time.time()
+
+def _invalidate_registry_index():
+    _registry_index_cache["ts"] = 0
+    _registry_index_cache["map"] = {}
+
+def _get_registry_index(ws):
+    """
+    Returns {reestr_number: row} for the Registry sheet.
+    Reads column A once and reuses it for REGISTRY_INDEX_TTL seconds.
+    """
+    if time.time() - _registry_index_cache["ts"] > REGISTRY_INDEX_TTL:
+        _set_registry_index(ws.col_values(1))
+    return _registry_index_cache["map"]
+
+# {spreadsheet_id: (fetched_at, {title: Worksheet})}, primed with one metadata call.
+# Other processes (daily_check, check_rss_all) add and remove sheets too, so entries expire.
+WORKSHEET_MAP_TTL = 300
+_ws_cache = {}
+
+def get_worksheet_map(sh):
+    entry = _ws_cache.get(sh.id)
+    if entry is None or time.time() - entry[0] > WORKSHEET_MAP_TTL:
+        # Only sheet properties are needed, not named ranges, protections, etc.
+        meta = sh.fetch_sheet_metadata({"includeGridData": "false", "fields": "sheets.properties"})
+        ws_map = {
+            item["properties"]["title"]: gspread.Worksheet(sh, item["properties"], sh.id, sh.client)
+            for item in meta.get("sheets", [])
+        }
+        entry = (time.time(), ws_map)
+        _ws_cache[sh.id] = entry
+    return entry[1]
+
+def add_worksheet_cached(sh, title, rows, cols):
     try:
-        return sh.worksheet("Registry")
-    except gspread.WorksheetNotFound:
-        ws = sh.add_worksheet(title="Registry", rows=1000, cols=20)
-        header = [
-            "Reestr Number", "Customer", "Price", "Price Source",
-            "Date Start", "Date End", "URL",
-            "Objects Hash", "Requisites Hash",
-            "Last Checked (UTC)", "Last Changed (UTC)"
-        ]
-        ws.append_row(header)
+        ws = sh.add_worksheet(title=title, rows=rows, cols=cols)
+    except gspread.exceptions.APIError:
+        # Stale map: another process may have created the sheet meanwhile
+        _ws_cache.pop(sh.id, None)
+        ws = get_worksheet_map(sh).get(title)
+        if ws is None:
+            raise
+        return ws
+    get_worksheet_map(sh)[title] = ws
+    return ws
+
+def add_worksheets_cached(sh, titles, rows, cols):
+    """
+    Creates several worksheets with one spreadsheets.batchUpdate call.
+    Falls back to one add_worksheet per title if the batch fails.
+    """
+    if not titles:
+        return {}
+    try:
+        response = google_write(sh.batch_update, {"requests": [
+            {"addSheet": {"properties": {
+                "title": title,
+                "gridProperties": {"rowCount": rows, "columnCount": cols}
+            }}}
+            for title in titles
+        ]})
+        ws_map = get_worksheet_map(sh)
+        created = {}
+        for reply in response.get("replies", []):
+            props = reply["addSheet"]["properties"]
+            ws = gspread.Worksheet(sh, props, sh.id, sh.client)
+            ws_map[props["title"]] = ws
+            created[props["title"]] = ws
+        return created
+    except Exception as e:
+        logging.warning(f"Batch addSheet failed, creating sheets one by one: {e}")
+        return {title: get_or_add_worksheet(sh, title, rows, cols) for title in titles}
+
+def get_or_add_worksheet(sh, title, rows, cols):
+    ws = get_worksheet_map(sh).get(title)
+    if ws is None:
+        ws = add_worksheet_cached(sh, title, rows, cols)
+    return ws
+
+def get_registry_worksheet(sh):
+    ws = get_worksheet_map(sh).get("Registry")
+    if ws:
         return ws
+    ws = add_worksheet_cached(sh, "Registry", rows=1000, cols=20)
+    header = [
+        "Reestr Number", "Customer", "Price", "Price Source",
+        "Date Start", "Date End", "URL",
+        "Objects Hash", "Requisites Hash",
+        "Last Checked (UTC)", "Last Changed (UTC)"
+    ]
+    ws.append_row(header)
+    _invalidate_registry_index()
+    return ws
 
 def upsert_registry_row(data, objects_changed, requisites_changed):
-    gc = get_gc()
-    if not gc:
-        return
-    sh = gc.open_by_key(MASTER_SHEET_ID)
-    ws = get_registry_worksheet(sh)
-    reestr_number = data.get("reestr_number", "")
+    """
+    Queues a Registry row write. Rows are flushed in batches
+    by _sheets_writer so handlers do not wait on Google Sheets round trips.
+    """
+    _sheets_writer.put(build_registry_row(data, objects_changed, requisites_changed))
+
+def build_registry_row(data, objects_changed, requisites_changed):
     now = datetime.datetime.utcnow().isoformat()
-    row = [
-        reestr_number,
+    return [
+        data.get("reestr_number", ""),
         data.get("customer", ""),
         data.get("price_clean", 0),
         data.get("price_source", ""),
@@ -440,14 +782,38 @@ def upsert_registry_row(data, objects_changed, requisites_changed):
         now,
         now if (objects_changed or requisites_changed) else ""
     ]
-    try:
-        cell = ws.find(reestr_number)
-        if cell:
-            ws.update(f"A{cell.row}:K{cell.row}", [row])
+
+def flush_registry_rows(rows):
+    """
+    Writes Registry rows: existing contracts in one batch_update,
+    new ones in one append_rows. Later rows for the same contract win.
+    """
+    if not rows:
+        return
+    gc = get_gc()
+    if not gc:
+        return
+    sh = get_master_sheet()
+    ws = get_registry_worksheet(sh)
+    index = _get_registry_index(ws)
+    updates = {}
+    appends = {}
+    for row in rows:
+        row_idx = index.get(row[0])
+        if row_idx:
+            updates[row_idx] = row
         else:
-            ws.append_row(row)
-    except gspread.exceptions.CellNotFound:
-        ws.append_row(row)
+            appends[row[0]] = row
+    if updates:
+        google_write(ws.batch_update, [
+            {"range": f"A{row_idx}:K{row_idx}", "values": [row]}
+            for row_idx, row in updates.items()
+        ])
+    if appends:
+        google_write(ws.append_rows, list(appends.values()))
+        _invalidate_registry_index()
+
+_sheets_writer = BackgroundBatchWriter("sheets-writer", flush_registry_rows, batch_size=200, interval=2)
 
 def create_contract_spreadsheet(gc, contract_number):
     sh = gc.create(contract_number)
@@ -525,10 +891,9 @@ def fetch_contract_data_via_ssh(url, max_retries=3, timeout=60):
                 time.sleep(2 ** attempt)
                 continue
                 
-            json_output = result.stdout.decode('utf-8')
             duration = time.time() - start_ts
             parse_logger.info(f"OK fetch_contract_data url={url} seconds={duration:.2f} attempt={attempt+1}")
-            return json.loads(json_output)
+            return json_loads(result.stdout)
             
         except subprocess.TimeoutExpired:
             parse_logger.error(f"TIMEOUT fetch_contract_data url={url} attempt={attempt+1} timeout={timeout}")
@@ -543,6 +908,31 @@ def fetch_contract_data_via_ssh(url, max_retries=3, timeout=60):
     
     return None
 
+FETCH_CACHE_TTL = 300
+FETCH_CACHE_MAX = 512
+# {url: (fetched_at, data)}, insertion-ordered so the oldest entry is evicted first
+_fetch_cache = {}
+_fetch_cache_lock = threading.Lock()
+
+def fetch_contract_data_cached(url):
+    """
+    fetch_contract_data_via_ssh with a short per-URL cache, so batches and
+    AI analysis of the same contract do not repeat the SSH round trip.
+    Failed fetches are not cached.
+    """
+    with _fetch_cache_lock:
+        entry = _fetch_cache.get(url)
+        if entry and time.time() - entry[0] < FETCH_CACHE_TTL:
+            return entry[1]
+    data = fetch_contract_data_via_ssh(url)
+    if data and "error" not in data:
+        with _fetch_cache_lock:
+            _fetch_cache.pop(url, None)
+            _fetch_cache[url] = (time.time(), data)
+            while len(_fetch_cache) > FETCH_CACHE_MAX:
+                del _fetch_cache[next(iter(_fetch_cache))]
+    return data
+
 def fetch_contract_preview_via_ssh(contract_numbers, max_retries=3, timeout=60):
     """
     Fetches preview information for multiple contracts via SSH.
@@ -571,10 +961,9 @@ def fetch_contract_preview_via_ssh(contract_numbers, max_retries=3, timeout=60):
                 time.sleep(2 ** attempt)
                 continue
                 
-            json_output = result.stdout.decode('utf-8')
             duration = time.time() - start_ts
             parse_logger.info(f"OK fetch_contract_preview count={len(contract_numbers)} seconds={duration:.2f} attempt={attempt+1}")
-            return json.loads(json_output)
+            return json_loads(result.stdout)
             
         except subprocess.TimeoutExpired:
             parse_logger.error(f"TIMEOUT fetch_contract_preview attempt={attempt+1} timeout={timeout}")
@@ -613,18 +1002,20 @@ def analyze_user_input(text):
     else:
         return {'type': 'multiple_numbers', 'data': numbers}
 
+# Contract registry numbers are 19+ digits
+_CONTRACT_NUMS_RE = re.compile(r'\b(\d{19,})\b')
+_CONTRACT_NUM_RE = re.compile(r'^\d{19,}$')
+
 def extract_contract_numbers(text):
     """
     Extracts contract numbers from text.
     Contract numbers are typically 19+ digits.
     """
-    # Pattern for contract numbers (19+ digits)
-    pattern = r'\b(\d{19,})\b'
-    numbers = re.findall(pattern, text)
+    numbers = _CONTRACT_NUMS_RE.findall(text)
     
-    # Validate and deduplicate
+    # Validate and deduplicate, keeping the order the user typed them in
     valid_numbers = []
-    for num in set(numbers):
+    for num in dict.fromkeys(numbers):
         if is_valid_contract_number(num):
             valid_numbers.append(num)
     
@@ -634,12 +1025,9 @@ def is_valid_contract_number(number):
     """
     Validates if a number looks like a contract registry number.
     """
-    if len(number) < 19:
-        return False
-    
     # Additional validation rules can be added here
     # For now, just check length and format
-    return number.isdigit()
+    return bool(_CONTRACT_NUM_RE.match(number))
 
 def get_contract_url_from_number(number):
     """
@@ -662,23 +1050,24 @@ def format_contract_list_preview(contracts):
             years[year] = []
         years[year].append(contract)
     
-    msg = f"📋 **Найдено {len(contracts)} контрактов:**\\n\\n"
+    msg = f"📋 **Найдено {len(contracts)} контрактов:**\n\n"
     
     for year, year_contracts in sorted(years.items(), reverse=True):
-        msg += f"🗓 **{year} год:** {len(year_contracts)} шт.\\n"
+        msg += f"🗓 **{year} год:** {len(year_contracts)} шт.\n"
         # Show first 2 contracts as examples
         for i, contract in enumerate(year_contracts[:2]):
             short_num = contract['number'][-6:]  # Last 6 digits
             customer = contract.get('customer', 'N/A')[:30] + ('...' if len(contract.get('customer', '')) > 30 else '')
-            msg += f"  • К-{short_num}: {customer}\\n"
+            msg += f"  • К-{short_num}: {customer}\n"
         
         if len(year_contracts) > 2:
-            msg += f"  • ...и еще {len(year_contracts) - 2}\\n"
-        msg += "\\n"
+            msg += f"  • ...и еще {len(year_contracts) - 2}\n"
+        msg += "\n"
     
     return msg
 
 # --- UTILS ---
+@lru_cache(maxsize=4096)
 def clean_number(value_str):
     """
     Cleans price/quantity strings to pure numbers.
@@ -780,17 +1169,14 @@ def extract_number_and_unit(value_str):
     
     return number, unit_part
 
+_TOTAL_RE = re.compile(r'итого|всего|total|сумма|合计|정리|подитог|общий', re.IGNORECASE)
+
+@lru_cache(maxsize=4096)
 def is_total_row(name):
     """
     Determines if a row is a total/summary row.
     """
-    if not name:
-        return False
-    
-    total_keywords = ["итого", "всего", "total", "сумма", "合计", "정리", "подитог", "общий"]
-    name_lower = name.lower().strip()
-    
-    return any(keyword in name_lower for keyword in total_keywords)
+    return bool(name and _TOTAL_RE.search(name))
 
 def parse_price_info(obj):
     """
@@ -828,27 +1214,24 @@ def validate_totals(objects_data, calculated_total):
     Validates parsed totals vs calculated totals.
     Returns validation result dict.
     """
-    # Extract parsed total from objects (excluding total rows)
-    parsed_total = 0.0
-    has_parsed_total = False
+    # Single pass: first explicit total row from parser and sum of all other items
+    total_row_value = None
+    items_sum = 0.0
     
     for obj in objects_data:
-        if is_total_row(obj.get('name', '')):
-            # This is a total row from parser
-            total_raw = obj.get('total', '0')
-            total_value, _ = extract_number_and_unit(total_raw)
+        is_total = is_total_row(obj.get('name', ''))
+        if is_total and total_row_value is not None:
+            continue
+        total_value, _ = extract_number_and_unit(obj.get('total', '0'))
+        if is_total:
             if total_value > 0:
-                parsed_total = total_value
-                has_parsed_total = True
-                break
+                total_row_value = total_value
+        else:
+            items_sum += total_value
     
-    # If no explicit total row, calculate sum of all non-total items
-    if not has_parsed_total:
-        for obj in objects_data:
-            if not is_total_row(obj.get('name', '')):
-                total_raw = obj.get('total', '0')
-                total_value, _ = extract_number_and_unit(total_raw)
-                parsed_total += total_value
+    # If no explicit total row, use sum of all non-total items
+    has_parsed_total = total_row_value is not None
+    parsed_total = total_row_value if has_parsed_total else items_sum
     
     # Check for discrepancy
     difference = abs(parsed_total - calculated_total)
@@ -888,10 +1271,187 @@ def format_validation_message(validation_result):
     return msg
 
 # --- SHEET CREATION ---
-def add_contract_to_master(data, objects_changed=None, requisites_changed=None):
+SUMMARY_ROWS = 30
+
+def build_contract_payload(data):
+    """
+    Pure part of add_contract_to_master: cleans numbers and builds the
+    Summary block, detail rows and validation result without any I/O.
+    """
+    # Clean execution numbers with logging
+    contract_price_raw = data.get('price', '0')
+    paid_raw = data.get('execution', {}).get('paid', '0')
+    accepted_raw = data.get('execution', {}).get('accepted', '0')
+    
+    contract_price_clean = clean_number(contract_price_raw)
+    paid_clean = clean_number(paid_raw)
+    accepted_clean = clean_number(accepted_raw)
+    
+    # Log for debugging
+    logging.info(f"Contract {data.get('reestr_number', 'Unknown')} prices - "
+                f"Contract raw: {contract_price_raw} -> clean: {contract_price_clean}, "
+                f"Paid raw: {paid_raw} -> clean: {paid_clean}, "
+                f"Accepted raw: {accepted_raw} -> clean: {accepted_clean}")
+
+    # 1. Header Info
+    # Determine remainder formula based on actual cell positions
+    if contract_price_clean > 0:
+        # Use cell references: Price is in C3, Accepted is in C10
+        remainder_formula = "=C3-C10"
+    else:
+        remainder_formula = "0.0"
+    
+    requisites = data.get("requisites", {})
+
+    info_data = [
+        ["КОНТРАКТ", data.get('reestr_number')],
+        ["Заказчик", data.get('customer')],
+        ["Цена контракта", contract_price_clean],
+        ["Источник цены", data.get("price_source", "")],
+        ["Дата начала", data.get('date_start', '-')],
+        ["Дата окончания", data.get('date_end', '-')],
+        ["Ссылка", data.get('url')],
+        ["Объекты HASH", data.get("objects_hash", "")],
+        ["Реквизиты HASH", data.get("requisites_hash", "")],
+        [],
+        ["ИСПОЛНЕНИЕ", ""],
+        ["Оплачено", paid_clean],
+        ["Принято (Акты)", accepted_clean],
+        ["Остаток лимита", remainder_formula],
+        [],
+        ["РЕКВИЗИТЫ", ""],
+        ["Банк", requisites.get("bank_name", "")],
+        ["БИК", requisites.get("bik", "")],
+        ["Р/С", requisites.get("account", "")],
+        ["К/С", requisites.get("corr_account", "")],
+        ["Лицевой счет", requisites.get("treasury_account", "")],
+        ["ИНН", requisites.get("inn", "")],
+        ["КПП", requisites.get("kpp", "")],
+    ]
+    # Pad to a fixed 30x2 block so the write overwrites stale cells in place
+    info_data = [row + [""] * (2 - len(row)) for row in info_data]
+    info_data += [["", ""]] * (SUMMARY_ROWS - len(info_data))
+
+    detail_rows = [
+        ["№", "Цена за единицу", "Ед.изм.", "Кол-во", "Сумма (Источник)", "Сумма (Расчет)", "Название"]
+    ]
+        
+    # 2. Items Table
+    objects = data.get('objects', [])
+    start_row = 1
+    
+    # Filter out total rows and parse all objects
+    parsed_objects = []
+    for obj in objects:
+        if not is_total_row(obj.get('name', '')):
+            parsed_obj = parse_price_info(obj)
+            parsed_objects.append(parsed_obj)
+    
+    if parsed_objects:
+        # Calculate totals for validation
+        calculated_total = sum(obj['total_sum'] for obj in parsed_objects)
+        
+        # Add item rows with proper formulas
+        for i, obj in enumerate(parsed_objects, start=1):
+            # Row index for formula (1-based)
+            current_row = start_row + i + 1
+            
+            # Validate row number
+            if current_row < 1:
+                logging.warning(f"Invalid row calculation: {current_row}")
+                continue
+            
+            # Formula for calculated sum (Quantity * Price)
+            calculated_sum_formula = f"=B{current_row}*D{current_row}"
+            
+            detail_rows.append([
+                i, # Position number
+                obj['price'], # Price per unit
+                obj['price_unit'] if obj['price_unit'] else obj['total_unit'], # Unit of measurement
+                obj['qty'], # Calculated Quantity
+                obj['total_sum'], # Source Sum
+                calculated_sum_formula, # Formula: Qty * Price
+                obj['name'] # Item name
+            ])
+            
+        # Add Total Check Formula with proper range validation
+        last_row = start_row + len(parsed_objects)
+        start_data_row = start_row + 1  # First row with actual item data
+        
+        # Validate range
+        if last_row > start_data_row:
+            source_total_formula = f"=SUM(E{start_data_row}:E{last_row})"
+            calc_total_formula = f"=SUM(F{start_data_row}:F{last_row})"
+        else:
+            source_total_formula = "0.0"
+            calc_total_formula = "0.0"
+            
+        detail_rows.append([
+            "ИТОГО", 
+            "", 
+            "", 
+            "", 
+            source_total_formula, # Sum of source totals
+            calc_total_formula, # Sum of calculated totals
+            ""
+        ])
+        
+        # Validate totals and return validation result
+        validation_result = validate_totals(objects, calculated_total)
+        
+        # TODO: AI валидация данных контракта (временно отключена)
+        # ai_validation = ai_service.validate_data(data)
+        # if ai_validation and not ai_validation.get('valid', True):
+        #     logging.info(f"AI validation found issues: {ai_validation.get('issues', [])}")
+        #     # Добавляем AI валидацию к результату
+        #     if not validation_result:
+        #         validation_result = {'ai_issues': ai_validation.get('issues', [])}
+        #     else:
+        #         validation_result['ai_issues'] = ai_validation.get('issues', [])
+        
+    else:
+        detail_rows.append(["(Детализация товаров не найдена или не спарсилась)"])
+        validation_result = None
+
+    return {
+        "summary_rows": info_data,
+        "detail_rows": detail_rows,
+        "validation": validation_result,
+    }
+
+def flush_contract_payload(gc, contract_title, payload, objects_changed, requisites_changed, today=None):
+    """
+    I/O part of add_contract_to_master: writes a prepared payload
+    to the contract spreadsheet. Returns (summary_url, validation_result).
+    today: ISO date used as the detail sheet title (defaults to the current date).
+    """
+    # Create or open contract spreadsheet (ignore trashed files)
+    existing_id = find_existing_contract_sheet_id(contract_title)
+    if existing_id:
+        sh = gc.open_by_key(existing_id)
+    else:
+        sh = create_contract_spreadsheet(gc, contract_title)
+
+    # Summary sheet
+    summary_ws = get_or_add_worksheet(sh, "Summary", rows=100, cols=20)
+    google_write(summary_ws.update, "A1", payload["summary_rows"], value_input_option="USER_ENTERED")
+
+    # Skip detailed sheet if no changes and already exists
+    detail_title = today or datetime.date.today().isoformat()
+    if not objects_changed and not requisites_changed:
+        if detail_title in get_worksheet_map(sh):
+            return summary_ws.url, None
+
+    ws = add_worksheet_cached(sh, detail_title, rows=100, cols=20)
+    google_write(ws.append_rows, payload["detail_rows"], value_input_option="USER_ENTERED")
+
+    return summary_ws.url, payload["validation"]
+
+def add_contract_to_master(data, objects_changed=None, requisites_changed=None, today=None):
     """
     Creates or updates a spreadsheet per contract.
     Summary sheet + dated sheet for each change.
+    today: optional ISO date computed once per check cycle.
     """
     init_db()
     gc = get_gc()
@@ -899,7 +1459,8 @@ def add_contract_to_master(data, objects_changed=None, requisites_changed=None):
         return None, "Ошибка подключения к Google Sheets"
 
     try:
-        reestr_number = data.get('reestr_number', 'Unknown')
+        _coerce_parsed(data)
+        reestr_number = data['reestr_number'] or 'Unknown'
         contract_title = reestr_number
 
         ok, info = check_drive_folder_access()
@@ -910,185 +1471,57 @@ def add_contract_to_master(data, objects_changed=None, requisites_changed=None):
         if objects_changed is None or requisites_changed is None:
             objects_changed, requisites_changed = determine_changes(data)
 
-        # Record check and history in DB
-        record_check(data)
-        record_history(data, objects_changed, requisites_changed)
-        upsert_contract(data, objects_changed, requisites_changed)
+        # Record check and history in DB (written in the background)
+        record_contract(data, objects_changed, requisites_changed)
 
         # Update registry sheet
         upsert_registry_row(data, objects_changed, requisites_changed)
 
-        # Create or open contract spreadsheet (ignore trashed files)
-        existing_id = find_existing_contract_sheet_id(contract_title)
-        if existing_id:
-            sh = gc.open_by_key(existing_id)
-        else:
-            sh = create_contract_spreadsheet(gc, contract_title)
-
-        # Summary sheet
-        try:
-            summary_ws = sh.worksheet("Summary")
-        except gspread.WorksheetNotFound:
-            summary_ws = sh.add_worksheet(title="Summary", rows=100, cols=20)
-        summary_ws.clear()
-
-        # --- FILL DATA ---
-        
-        # Clean execution numbers with logging
-        contract_price_raw = data.get('price', '0')
-        paid_raw = data.get('execution', {}).get('paid', '0')
-        accepted_raw = data.get('execution', {}).get('accepted', '0')
-        
-        contract_price_clean = clean_number(contract_price_raw)
-        paid_clean = clean_number(paid_raw)
-        accepted_clean = clean_number(accepted_raw)
-        
-        # Log for debugging
-        logging.info(f"Contract {data.get('reestr_number', 'Unknown')} prices - "
-                    f"Contract raw: {contract_price_raw} -> clean: {contract_price_clean}, "
-                    f"Paid raw: {paid_raw} -> clean: {paid_clean}, "
-                    f"Accepted raw: {accepted_raw} -> clean: {accepted_clean}")
-
-        # 1. Header Info
-        # Determine remainder formula based on actual cell positions
-        if contract_price_clean > 0:
-            # Use cell references: Price is in C3, Accepted is in C10
-            remainder_formula = "=C3-C10"
-        else:
-            remainder_formula = "0.0"
-        
-        requisites = data.get("requisites", {})
-
-        info_data = [
-            ["КОНТРАКТ", data.get('reestr_number')],
-            ["Заказчик", data.get('customer')],
-            ["Цена контракта", contract_price_clean],
-            ["Источник цены", data.get("price_source", "")],
-            ["Дата начала", data.get('date_start', '-')],
-            ["Дата окончания", data.get('date_end', '-')],
-            ["Ссылка", data.get('url')],
-            ["Объекты HASH", data.get("objects_hash", "")],
-            ["Реквизиты HASH", data.get("requisites_hash", "")],
-            [], 
-            ["ИСПОЛНЕНИЕ", ""],
-            ["Оплачено", paid_clean],
-            ["Принято (Акты)", accepted_clean],
-            ["Остаток лимита", remainder_formula],
-            [],
-            ["РЕКВИЗИТЫ", ""],
-            ["Банк", requisites.get("bank_name", "")],
-            ["БИК", requisites.get("bik", "")],
-            ["Р/С", requisites.get("account", "")],
-            ["К/С", requisites.get("corr_account", "")],
-            ["Лицевой счет", requisites.get("treasury_account", "")],
-            ["ИНН", requisites.get("inn", "")],
-            ["КПП", requisites.get("kpp", "")],
-        ]
-        for row in info_data:
-            summary_ws.append_row(row, value_input_option="USER_ENTERED")
-
-        # Skip detailed sheet if no changes and already exists
-        today = datetime.date.today().isoformat()
-        detail_title = today
-        if not objects_changed and not requisites_changed:
-            try:
-                sh.worksheet(detail_title)
-                return summary_ws.url, None
-            except gspread.WorksheetNotFound:
-                pass
-
-        ws = sh.add_worksheet(title=detail_title, rows=100, cols=20)
-        ws.append_row(
-            ["№", "Цена за единицу", "Ед.изм.", "Кол-во", "Сумма (Источник)", "Сумма (Расчет)", "Название"],
-            value_input_option="USER_ENTERED"
-        )
-            
-        # 2. Items Table
-        objects = data.get('objects', [])
-        start_row = 1
-        
-        # Filter out total rows and parse all objects
-        parsed_objects = []
-        for obj in objects:
-            if not is_total_row(obj.get('name', '')):
-                parsed_obj = parse_price_info(obj)
-                parsed_objects.append(parsed_obj)
-        
-        if parsed_objects:
-            # Calculate totals for validation
-            calculated_total = sum(obj['total_sum'] for obj in parsed_objects)
-            
-            # Add item rows with proper formulas
-            for i, obj in enumerate(parsed_objects, start=1):
-                # Row index for formula (1-based)
-                current_row = start_row + i + 1
-                
-                # Validate row number
-                if current_row < 1:
-                    logging.warning(f"Invalid row calculation: {current_row}")
-                    continue
-                
-                # Formula for calculated sum (Quantity * Price)
-                calculated_sum_formula = f"=B{current_row}*D{current_row}"
-                
-                ws.append_row([
-                    i, # Position number
-                    obj['price'], # Price per unit
-                    obj['price_unit'] if obj['price_unit'] else obj['total_unit'], # Unit of measurement
-                    obj['qty'], # Calculated Quantity
-                    obj['total_sum'], # Source Sum
-                    calculated_sum_formula, # Formula: Qty * Price
-                    obj['name'] # Item name
-                ], value_input_option="USER_ENTERED")
-                
-            # Add Total Check Formula with proper range validation
-            last_row = start_row + len(parsed_objects)
-            start_data_row = start_row + 1  # First row with actual item data
-            
-            # Validate range
-            if last_row > start_data_row:
-                source_total_formula = f"=SUM(E{start_data_row}:E{last_row})"
-                calc_total_formula = f"=SUM(F{start_data_row}:F{last_row})"
-            else:
-                source_total_formula = "0.0"
-                calc_total_formula = "0.0"
-                
-            ws.append_row([
-                "ИТОГО", 
-                "", 
-                "", 
-                "", 
-                source_total_formula, # Sum of source totals
-                calc_total_formula, # Sum of calculated totals
-                ""
-            ], value_input_option="USER_ENTERED")
-            
-
-            
-            # Validate totals and return validation result
-            validation_result = validate_totals(objects, calculated_total)
-            
-            # TODO: AI валидация данных контракта (временно отключена)
-            # ai_validation = ai_service.validate_data(data)
-            # if ai_validation and not ai_validation.get('valid', True):
-            #     logging.info(f"AI validation found issues: {ai_validation.get('issues', [])}")
-            #     # Добавляем AI валидацию к результату
-            #     if not validation_result:
-            #         validation_result = {'ai_issues': ai_validation.get('issues', [])}
-            #     else:
-            #         validation_result['ai_issues'] = ai_validation.get('issues', [])
-            
-        else:
-            ws.append_row(["(Детализация товаров не найдена или не спарсилась)"], value_input_option="USER_ENTERED")
-            validation_result = None
-
-        return summary_ws.url, validation_result
+        # Build all sheet values first, then write them
+        payload = build_contract_payload(data)
+        return flush_contract_payload(gc, contract_title, payload, objects_changed, requisites_changed, today)
         
     except Exception as e:
         error_details = traceback.format_exc()
         logging.error(f"Error updating sheet: {error_details}")
         return None, str(e)
 
+BATCH_SHEET_HEADER = [
+    "КОНТРАКТ", "Заказчик", "Цена", "Дата начала", 
+    "Дата окончания", "Ссылка", "Оплачено", "Принято", "Остаток лимита"
+]
+
+def build_batch_sheet_rows(contracts, log_label):
+    """
+    Builds header + one row per contract for a batch sheet.
+    Columns are collected separately and zipped into rows at the end.
+    """
+    executions = [c.get('execution', {}) for c in contracts]
+    reestrs = [c.get('reestr_number', '') for c in contracts]
+    customers = [c.get('customer', '') for c in contracts]
+    prices_raw = [c.get('price', '0') for c in contracts]
+    prices = list(map(clean_number, prices_raw))
+    starts = [c.get('date_start', '') for c in contracts]
+    ends = [c.get('date_end', '') for c in contracts]
+    urls = [c.get('url', '') for c in contracts]
+    paids = [clean_number(e.get('paid', '0')) for e in executions]
+    accepteds = [clean_number(e.get('accepted', '0')) for e in executions]
+    # Remainder is stored as a value, not a per-row formula, to avoid sheet recalculation
+    remainders = [
+        price - accepted if price > 0 else 0.0
+        for price, accepted in zip(prices, accepteds)
+    ]
+    
+    # Log for debugging
+    for reestr, raw, price in zip(reestrs, prices_raw, prices):
+        logging.info(f"{log_label} {reestr or 'Unknown'} - "
+                    f"Raw price: {raw} -> clean: {price}")
+    
+    rows = [BATCH_SHEET_HEADER]
+    rows.extend(map(list, zip(reestrs, customers, prices, starts, ends, urls,
+                              paids, accepteds, remainders)))
+    return rows
+
 def add_contracts_by_year(contracts_data):
     """
     Adds contracts to separate sheets grouped by year.
@@ -1099,7 +1532,7 @@ def add_contracts_by_year(contracts_data):
         return {}
     
     try:
-        sh = gc.open_by_key(MASTER_SHEET_ID)
+        sh = get_master_sheet()
         sheet_urls = {}
         
         # Group contracts by year
@@ -1111,68 +1544,41 @@ def add_contracts_by_year(contracts_data):
                 contracts_by_year[year] = []
             contracts_by_year[year].append(contract)
         
+        # Create all missing year sheets in one request
+        ws_map = get_worksheet_map(sh)
+        missing_titles = [
+            f"Контракты_{year}" for year in contracts_by_year
+            if f"Контракты_{year}" not in ws_map
+        ]
+        add_worksheets_cached(sh, missing_titles, rows=1000, cols=20)
+        
+        # Ranges to clear and values to write are sent in one request each
+        clear_ranges = []
+        value_ranges = []
         for year, contracts in contracts_by_year.items():
-            # Create or get sheet for the year
             sheet_title = f"Контракты_{year}"
+            ws = ws_map[sheet_title]
+            if sheet_title not in missing_titles:
+                clear_ranges.append(f"'{sheet_title}'")
             
-            try:
-                # Check if sheet exists
-                ws = sh.worksheet(sheet_title)
-            except gspread.WorksheetNotFound:
-                # Create new sheet
-                ws = sh.add_worksheet(title=sheet_title, rows=1000, cols=20)
-            
-            # Clear existing content
-            ws.clear()
-            
-            # Add header
-            header = [
-                "КОНТРАКТ", "Заказчик", "Цена", "Дата начала", 
-                "Дата окончания", "Ссылка", "Оплачено", "Принято", "Остаток лимита"
-            ]
-            ws.append_row(header)
-            
-            # Add contracts with improved formula handling
-            row_num = 2  # Start after header (row 2)
-            for contract in contracts:
-                contract_price_raw = contract.get('price', '0')
-                contract_price_clean = clean_number(contract_price_raw)
-                paid_clean = clean_number(contract.get('execution', {}).get('paid', '0'))
-                accepted_clean = clean_number(contract.get('execution', {}).get('accepted', '0'))
-                
-                # Log for debugging
-                logging.info(f"Batch contract {contract.get('reestr_number', 'Unknown')} - "
-                            f"Raw price: {contract_price_raw} -> clean: {contract_price_clean}")
-                
-                # Create proper formula for remainder
-                if contract_price_clean > 0:
-                    remainder_formula = f"=C{row_num}-I{row_num}"  # Price - Accepted
-                else:
-                    remainder_formula = "0.0"
-                
-                row = [
-                    contract.get('reestr_number', ''),
-                    contract.get('customer', ''),
-                    contract_price_clean,
-                    contract.get('date_start', ''),
-                    contract.get('date_end', ''),
-                    contract.get('url', ''),
-                    paid_clean,
-                    accepted_clean,
-                    remainder_formula
-                ]
-                ws.append_row(row)
-                row_num += 1
-            
+            value_ranges.append({
+                "range": f"'{sheet_title}'!A1",
+                "values": build_batch_sheet_rows(contracts, "Batch contract")
+            })
             sheet_urls[year] = ws.url
         
+        if clear_ranges:
+            google_write(sh.values_batch_clear, body={"ranges": clear_ranges})
+        if value_ranges:
+            google_write(sh.values_batch_update, {"valueInputOption": "USER_ENTERED", "data": value_ranges})
+        
         return sheet_urls
         
     except Exception as e:
         logging.error(f"Error adding contracts by year: {e}")
         return {}
 
-def add_contracts_to_single_sheet(contracts_data):
+def add_contracts_to_single_sheet(contracts_data, timestamp=None):
     """
     Adds all contracts to a single sheet.
     Returns list of sheet_urls (should be one)
@@ -1182,60 +1588,29 @@ def add_contracts_to_single_sheet(contracts_data):
         return []
     
     try:
-        sh = gc.open_by_key(MASTER_SHEET_ID)
+        sh = get_master_sheet()
         
         # Create sheet with timestamp
-        import datetime
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M")
+        timestamp = timestamp or datetime.datetime.now().strftime("%Y%m%d_%H%M")
         sheet_title = f"Партия_{timestamp}"
         
-        ws = sh.add_worksheet(title=sheet_title, rows=1000, cols=20)
-        
-        # Add header
-        header = [
-            "КОНТРАКТ", "Заказчик", "Цена", "Дата начала", 
-            "Дата окончания", "Ссылка", "Оплачено", "Принято", "Остаток лимита"
-        ]
-        ws.append_row(header)
-        
-        # Add contracts with improved formula handling
-        row_num = 2  # Start after header (row 2)
-        for contract in contracts_data:
-            contract_price_raw = contract.get('price', '0')
-            contract_price_clean = clean_number(contract_price_raw)
-            paid_clean = clean_number(contract.get('execution', {}).get('paid', '0'))
-            accepted_clean = clean_number(contract.get('execution', {}).get('accepted', '0'))
-            
-            # Log for debugging
-            logging.info(f"Single sheet contract {contract.get('reestr_number', 'Unknown')} - "
-                        f"Raw price: {contract_price_raw} -> clean: {contract_price_clean}")
-            
-            # Create proper formula for remainder
-            if contract_price_clean > 0:
-                remainder_formula = f"=C{row_num}-I{row_num}"  # Price - Accepted
-            else:
-                remainder_formula = "0.0"
-            
-            row = [
-                contract.get('reestr_number', ''),
-                contract.get('customer', ''),
-                contract_price_clean,
-                contract.get('date_start', ''),
-                contract.get('date_end', ''),
-                contract.get('url', ''),
-                paid_clean,
-                accepted_clean,
-                remainder_formula
-            ]
-            ws.append_row(row)
-            row_num += 1
+        ws = add_worksheet_cached(sh, sheet_title, rows=1000, cols=20)
         
+        google_write(sh.values_batch_update, {
+            "valueInputOption": "USER_ENTERED",
+            "data": [{
+                "range": f"'{sheet_title}'!A1",
+                "values": build_batch_sheet_rows(contracts_data, "Single sheet contract")
+            }]
+        })
         return [ws.url]
         
     except Exception as e:
         logging.error(f"Error adding contracts to single sheet: {e}")
         return []
 
+_YEAR_RE = re.compile(r'(\d{4})')
+
 def extract_contract_year(contract):
     """
     Extracts year from contract data.
@@ -1245,48 +1620,61 @@ def extract_contract_year(contract):
         date_str = contract.get(date_field, '')
         if date_str:
             # Extract 4-digit year from date string
-            year_match = re.search(r'(\d{4})', date_str)
+            year_match = _YEAR_RE.search(date_str)
             if year_match:
                 return year_match.group(1)
     
     # Fallback: try to extract from contract number (some numbers contain year info)
     contract_number = contract.get('reestr_number', '')
     # Check if contract number contains year in last 2 digits + some pattern
-    if len(contract_number) >= 19:
+    if _CONTRACT_NUM_RE.match(contract_number):
         # Try to extract year from position 15-16 (common in Russian procurement numbers)
-        potential_year = "20" + contract_number[14:16]
-        if 2020 <= int(potential_year) <= 2030:
-            return potential_year
+        year_digits = contract_number[14:16]
+        if year_digits.isdigit() and 20 <= int(year_digits) <= 30:
+            return "20" + year_digits
     
     # Default to current year
     return "2025"
 
+TELEGRAM_CHUNK_LIMIT = 3500
+
 def send_batch_report(chat_id, processed, errors, sheet_urls, group_by_year):
     """
     Sends final report for batch processing.
+    Long reports are split on line boundaries into several messages.
     """
-    msg = f"📊 **Обработка завершена!**\\n\\n"
-    msg += f"✅ Успешно: {processed}\\n"
+    parts = [
+        "📊 **Обработка завершена!**",
+        "",
+        f"✅ Успешно: {processed}",
+    ]
     
     if errors:
-        msg += f"❌ Ошибок: {len(errors)}\\n\\n"
-        msg += "Ошибки:\\n"
-        for error in errors[:5]:  # Show first 5 errors
-            msg += f"• {error}\\n"
+        parts.append(f"❌ Ошибок: {len(errors)}")
+        parts.append("")
+        parts.append("Ошибки:")
+        parts.extend(f"• {error}" for error in errors[:5])  # Show first 5 errors
         if len(errors) > 5:
-            msg += f"...и еще {len(errors) - 5}\\n"
+            parts.append(f"...и еще {len(errors) - 5}")
     else:
-        msg += "🎉 Без ошибок!\\n\\n"
+        parts.append("🎉 Без ошибок!")
+        parts.append("")
     
-    msg += "📋 **Созданы листы:**\\n"
+    parts.append("📋 **Созданы листы:**")
     if group_by_year:
-        for year, url in sheet_urls.items():
-            msg += f"🗓 {year} год: [Ссылка]({url})\\n"
+        parts.extend(f"🗓 {year} год: [Ссылка]({url})" for year, url in sheet_urls.items())
     else:
-        for url in sheet_urls:
-            msg += f"📄 [Партия]({url})\\n"
+        parts.extend(f"📄 [Партия]({url})" for url in sheet_urls)
     
-    bot.send_message(chat_id, msg, parse_mode='Markdown')
+    chunk, size = [], 0
+    for part in parts:
+        if chunk and size + len(part) + 1 > TELEGRAM_CHUNK_LIMIT:
+            bot.send_message(chat_id, "\n".join(chunk), parse_mode='Markdown')
+            chunk, size = [], 0
+        chunk.append(part)
+        size += len(part) + 1
+    if chunk:
+        bot.send_message(chat_id, "\n".join(chunk), parse_mode='Markdown')
 
 
 
@@ -1320,6 +1708,10 @@ def clear_drive_trash(message):
         bot.reply_to(message, "🗑 Корзина бота очищена. Попробуйте создать файл снова.")
     except Exception as e:
         bot.reply_to(message, f"❌ Ошибка очистки корзины: {e}")
+
+# Markdown escaping for file names, applied in a single pass
+_MD_ESCAPE = str.maketrans({'_': '\\_', '*': '\\*', '`': '\\`'})
+
 def check_drive_access(message):
     global TARGET_FOLDER_ID
     service = get_drive_service()
@@ -1347,7 +1739,7 @@ def check_drive_access(message):
                 msg += f"{icon} **{item['name']}** (ID сохранен!)\n"
             else:
                 # Escape special characters for Markdown to avoid 400 Bad Request
-                safe_name = item['name'].replace('_', '\\_').replace('*', '\\*').replace('`', '\\`')
+                safe_name = item['name'].translate(_MD_ESCAPE)
                 msg += f"{icon} {safe_name}\n"
         
         bot.reply_to(message, msg, parse_mode='Markdown')
@@ -1422,17 +1814,17 @@ def handle_all_messages(message):
     
     if analysis['type'] == 'unknown':
         bot.reply_to(message, 
-            "❓ Не удалось определить формат ввода.\\n\\n"
-            "Отправьте одно из следующего:\\n"
-            "• Ссылку на zakupki.gov.ru\\n"
-            "• Номер контракта (19+ цифр)\\n"
+            "❓ Не удалось определить формат ввода.\n\n"
+            "Отправьте одно из следующего:\n"
+            "• Ссылку на zakupki.gov.ru\n"
+            "• Номер контракта (19+ цифр)\n"
             "• Список номеров через запятую или пробел")
         return
     
     if analysis['type'] == 'url':
         # Existing URL handling
         url = analysis['data']
-        bot.reply_to(message, "🚀 Полный парсинг контракта (включая акты и товары)...\\nЭто может занять 10-20 секунд.")
+        bot.reply_to(message, "🚀 Полный парсинг контракта (включая акты и товары)...\nЭто может занять 10-20 секунд.")
         process_contract_parsing(message.chat_id, url)
     
     elif analysis['type'] == 'single_number':
@@ -1461,8 +1853,8 @@ def show_single_contract_confirmation(message, contract_number):
     
     short_num = contract_number[-6:]
     bot.reply_to(message, 
-        f"🔍 **Найден контракт К-{short_num}**\\n\\n"
-        f"Полный номер: `{contract_number}`\\n\\n"
+        f"🔍 **Найден контракт К-{short_num}**\n\n"
+        f"Полный номер: `{contract_number}`\n\n"
         f"Продолжить парсинг?",
         reply_markup=markup,
         parse_mode='Markdown'
@@ -1504,7 +1896,7 @@ def show_batch_options(message, contract_numbers):
     ))
     
     bot.reply_to(message, 
-        f"📋 **Как обработать {len(contract_numbers)} контрактов?**\\n\\n"
+        f"📋 **Как обработать {len(contract_numbers)} контрактов?**\n\n"
         "Выберите способ группировки в Google Sheets:",
         reply_markup=markup,
         parse_mode='Markdown'
@@ -1525,10 +1917,12 @@ def process_contract_parsing(chat_id, url):
          # error_analysis = ai_service.classify_error(err, {"url": url})  # Temporarily disabled
          error_analysis = {"category": "unknown", "suggestions": ["Check logs for details"]}
          
-         msg = f"❌ Ошибка парсинга: {err}\\n\\n"
-         msg += f"🔍 **Тип ошибки:** {error_analysis.get('category', 'UNKNOWN')}\\n"
-         msg += f"💡 **Рекомендация:** {error_analysis.get('suggestion', 'Попробуйте повторить запрос')}\\n\\n"
-         msg += f"🧠 *Анализ выполнен сервисом: {error_analysis.get('service', 'unknown')}*"
+         msg = (
+             f"❌ Ошибка парсинга: {err}\n\n"
+             f"🔍 **Тип ошибки:** {error_analysis.get('category', 'UNKNOWN')}\n"
+             f"💡 **Рекомендация:** {error_analysis.get('suggestion', 'Попробуйте повторить запрос')}\n\n"
+             f"🧠 *Анализ выполнен сервисом: {error_analysis.get('service', 'unknown')}*"
+         )
          
          bot.send_message(chat_id, msg, parse_mode='Markdown')
          return
@@ -1552,9 +1946,11 @@ def process_contract_parsing(chat_id, url):
     
     # Enhanced price analysis
     if contract_price_clean <= 0:
-        warning_msg = f"⚠️ **Внимание:** Цена контракта = 0.0\\n\\n"
-        warning_msg += f"Исходные данные: `{contract_price_raw}`\\n\\n"
-        warning_msg += f"Обработанное значение: {contract_price_clean}\\n\\n"
+        warning_msg = (
+            f"⚠️ **Внимание:** Цена контракта = 0.0\n\n"
+            f"Исходные данные: `{contract_price_raw}`\n\n"
+            f"Обработанное значение: {contract_price_clean}\n\n"
+        )
         
         # Check if we have object totals for fallback
         objects = data.get('objects', [])
@@ -1564,7 +1960,7 @@ def process_contract_parsing(chat_id, url):
                 )
             )
             if total_from_objects > 0:
-                warning_msg += f"\\n💡 **Fallback использована:** Сумма объектов = {total_from_objects:,.2f} руб\\n"
+                warning_msg += f"\n💡 **Fallback использована:** Сумма объектов = {total_from_objects:,.2f} руб\n"
                 warning_msg += "Цена контракта будет обновлена из суммы объектов"
                 
                 # Update the price in data for Google Sheets
@@ -1572,9 +1968,9 @@ def process_contract_parsing(chat_id, url):
                 data['price_fallback_used'] = True
                 contract_price_clean = total_from_objects
             else:
-                warning_msg += f"\\n❌ **Fallback не удался:** Не удалось рассчитать из объектов"
+                warning_msg += f"\n❌ **Fallback не удался:** Не удалось рассчитать из объектов"
         
-        warning_msg += f"\\n📁 **Архивировано файлов:** {len(files_saved)} шт"
+        warning_msg += f"\n📁 **Архивировано файлов:** {len(files_saved)} шт"
         
         bot.send_message(chat_id, warning_msg, parse_mode='Markdown')
     else:
@@ -1583,11 +1979,13 @@ def process_contract_parsing(chat_id, url):
             logging.info(f"Contract {contract_number} archived {len(files_saved)} debug files")
     
     # Notify user about parsing result
-    response_text = f"✅ **Данные получены**\\n"
-    response_text += f"Контракт: `{data.get('reestr_number')}`\\n"
-    response_text += f"Цена: {data.get('price')}\\n"
-    response_text += f"Оплачено: {data.get('execution', {}).get('paid')}\\n"
-    response_text += f"Товаров/Услуг найдено: {len(data.get('objects', []))}"
+    response_text = (
+        f"✅ **Данные получены**\n"
+        f"Контракт: `{data.get('reestr_number')}`\n"
+        f"Цена: {data.get('price')}\n"
+        f"Оплачено: {data.get('execution', {}).get('paid')}\n"
+        f"Товаров/Услуг найдено: {len(data.get('objects', []))}"
+    )
     
     bot.send_message(chat_id, response_text, parse_mode='Markdown')
     
@@ -1596,10 +1994,12 @@ def process_contract_parsing(chat_id, url):
     sheet_url, validation_result = add_contract_to_master(data)
     
     if sheet_url:
-        msg = f"📊 **Лист создан!**\\n\\n"
-        msg += f"🔗 **Ссылка:** [{sheet_url}]({sheet_url})\\n\\n"
-        msg += "📢 **Важно:** Таблица доступна по публичной ссылке\\n"
-        msg += "💾 Сохраните ссылку для будущего доступа"
+        msg = (
+            f"📊 **Лист создан!**\n\n"
+            f"🔗 **Ссылка:** [{sheet_url}]({sheet_url})\n\n"
+            "📢 **Важно:** Таблица доступна по публичной ссылке\n"
+            "💾 Сохраните ссылку для будущего доступа"
+        )
         
         bot.send_message(chat_id, msg, parse_mode='Markdown', disable_web_page_preview=True)
         
@@ -1611,9 +2011,14 @@ def process_contract_parsing(chat_id, url):
         err = validation_result if isinstance(validation_result, str) else "Неизвестная ошибка"
         bot.send_message(chat_id, f"❌ Ошибка записи в таблицу: {err}")
 
-def check_contract_update(chat_id, contract_number, silent=False):
+# Parallel contract checks in /check_all and daily_check
+CHECK_WORKERS = 6
+
+def check_contract_update(chat_id, contract_number, silent=False, hashes_map=None, today=None):
     """
     Checks a contract by number and updates sheets/DB.
+    hashes_map: optional result of load_all_hashes() shared across a check cycle.
+    today: optional ISO date shared across a check cycle.
     """
     url = get_contract_url_from_number(contract_number)
     parse_logger.info(f"CHECK start contract={contract_number}")
@@ -1624,8 +2029,11 @@ def check_contract_update(chat_id, contract_number, silent=False):
         safe_send(chat_id, f"❌ Ошибка проверки К-{contract_number[-6:]}: {err}")
         return False, False
 
-    objects_changed, requisites_changed = determine_changes(data)
-    sheet_url, _ = add_contract_to_master(data, objects_changed, requisites_changed)
+    if hashes_map is not None:
+        objects_changed, requisites_changed = determine_changes_cached(data, hashes_map)
+    else:
+        objects_changed, requisites_changed = determine_changes(data)
+    sheet_url, _ = add_contract_to_master(data, objects_changed, requisites_changed, today=today)
     parse_logger.info(f"CHECK done contract={contract_number} objects_changed={objects_changed} requisites_changed={requisites_changed}")
 
     if not silent:
@@ -1639,6 +2047,33 @@ def check_contract_update(chat_id, contract_number, silent=False):
 
     return True, (objects_changed or requisites_changed)
 
+BATCH_FETCH_WORKERS = 8
+# Telegram allows roughly one message edit per second per chat
+PROGRESS_EDIT_INTERVAL = 1.5
+
+def edit_progress(chat_id, message_id, text):
+    """
+    Edits a progress message and returns the monotonic time after which
+    the next edit may be sent. A 429 response pushes that time by retry_after.
+    """
+    now = time.monotonic()
+    try:
+        bot.edit_message_text(chat_id=chat_id, message_id=message_id, text=text)
+    except telebot.apihelper.ApiTelegramException as e:
+        if e.error_code != 429:
+            raise
+        retry_after = (e.result_json or {}).get("parameters", {}).get("retry_after", PROGRESS_EDIT_INTERVAL)
+        logging.warning(f"Progress edit rate limited, retry after {retry_after}s")
+        return now + retry_after
+    return now + PROGRESS_EDIT_INTERVAL
+
+def _fetch_batch_contract(contract_number):
+    try:
+        url = get_contract_url_from_number(contract_number)
+        return contract_number, fetch_contract_data_cached(url), None
+    except Exception as e:
+        return contract_number, None, e
+
 def process_batch_contracts(user_id, contract_numbers, group_by_year=True):
     """
     Processes batch contracts.
@@ -1647,51 +2082,54 @@ def process_batch_contracts(user_id, contract_numbers, group_by_year=True):
     
     # Show initial progress
     progress_msg = bot.send_message(chat_id, 
-        f"📊 **Начинаю пакетную обработку**\\n"
-        f"Контрактов: {len(contract_numbers)}\\n"
-        f"Группировка: {'по годам' if group_by_year else 'все вместе'}\\n\\n"
+        f"📊 **Начинаю пакетную обработку**\n"
+        f"Контрактов: {len(contract_numbers)}\n"
+        f"Группировка: {'по годам' if group_by_year else 'все вместе'}\n\n"
         f"0/{len(contract_numbers)} завершено..."
     )
     
-    # Process contracts
+    # Process contracts: SSH fetches run in parallel, progress follows completion order
     processed = 0
     errors = []
-    results = []
-    
-    for i, contract_number in enumerate(contract_numbers):
-        try:
-            url = get_contract_url_from_number(contract_number)
-            data = fetch_contract_data_via_ssh(url)
+    results = {}
+    next_edit = 0.0
+    
+    with ThreadPoolExecutor(max_workers=BATCH_FETCH_WORKERS) as executor:
+        futures = [executor.submit(_fetch_batch_contract, c) for c in contract_numbers]
+        positions = {fut: pos for pos, fut in enumerate(futures)}
+        for i, fut in enumerate(as_completed(futures)):
+            contract_number, data, fetch_error = fut.result()
+            try:
+                if fetch_error:
+                    raise fetch_error
             
-            if data and "error" not in data:
-                results.append(data)
-                processed += 1
-            else:
-                errors.append(f"К-{contract_number[-6:]}: {data.get('error', 'Unknown error') if data else 'No data'}")
+                if data and "error" not in data:
+                    results[positions[fut]] = data
+                    processed += 1
+                else:
+                    errors.append(f"К-{contract_number[-6:]}: {data.get('error', 'Unknown error') if data else 'No data'}")
             
-            # Update progress every 3 contracts
-            if (i + 1) % 3 == 0 or i == len(contract_numbers) - 1:
-                progress_text = (
-                    f"📊 **Пакетная обработка**\\n"
-                    f"Контрактов: {len(contract_numbers)}\\n"
-                    f"Группировка: {'по годам' if group_by_year else 'все вместе'}\\n\\n"
-                    f"{processed}/{len(contract_numbers)} завершено..."
-                )
+                # Update progress at most once per PROGRESS_EDIT_INTERVAL; the last one always goes out
+                is_last = i == len(contract_numbers) - 1
+                if is_last or time.monotonic() >= next_edit:
+                    progress_text = (
+                        f"📊 **Пакетная обработка**\n"
+                        f"Контрактов: {len(contract_numbers)}\n"
+                        f"Группировка: {'по годам' if group_by_year else 'все вместе'}\n\n"
+                        f"{processed}/{len(contract_numbers)} завершено..."
+                    )
                 
-                if errors:
-                    progress_text += f"\\n⚠️ Ошибок: {len(errors)}"
+                    if errors:
+                        progress_text += f"\n⚠️ Ошибок: {len(errors)}"
                 
-                bot.edit_message_text(
-                    chat_id=chat_id,
-                    message_id=progress_msg.message_id,
-                    text=progress_text
-                )
+                    next_edit = edit_progress(chat_id, progress_msg.message_id, progress_text)
             
-        except Exception as e:
-            errors.append(f"К-{contract_number[-6:]}: {str(e)}")
-            logging.error(f"Error processing contract {contract_number}: {e}")
+            except Exception as e:
+                errors.append(f"К-{contract_number[-6:]}: {str(e)}")
+                logging.error(f"Error processing contract {contract_number}: {e}")
     
-    # Final results
+    # Final results, in the order the contracts were submitted
+    results = [results[pos] for pos in sorted(results)]
     if group_by_year:
         sheet_urls = add_contracts_by_year(results)
     else:
@@ -1738,8 +2176,8 @@ def handle_ai_analysis(message):
     
     # Запрашиваем URL или номер контракта
     msg = bot.send_message(message.chat.id, 
-        "🤖 **AI Анализ Контракта**\\n\\n"
-        "Отправьте URL контракта или номер реестра для детального AI анализа\\n\\n"
+        "🤖 **AI Анализ Контракта**\n\n"
+        "Отправьте URL контракта или номер реестра для детального AI анализа\n\n"
         "Или введите 'last' для анализа последнего обработанного контракта")
     
     bot.register_next_step_handler(msg, process_ai_analysis)
@@ -1773,21 +2211,27 @@ def handle_check_all(message):
     if not (user_id == SUPER_ADMIN_ID or user_id in ADMIN_IDS):
         bot.reply_to(message, "🚫 У вас нет прав для этой команды")
         return
-    contract_numbers = get_contract_numbers_from_registry()
-    if not contract_numbers:
-        contract_numbers = get_contract_numbers_from_db()
+    contract_numbers = get_contracts_prefer_registry()
     if not contract_numbers:
         bot.reply_to(message, "Реестр пуст. Сначала добавьте контракты.")
         return
     bot.reply_to(message, f"🔄 Проверяю {len(contract_numbers)} контрактов...")
+    hashes_map = load_all_hashes()
+    today = datetime.date.today().isoformat()
     processed = 0
     changed = 0
-    for number in contract_numbers:
-        ok, did_change = check_contract_update(message.chat.id, number, silent=True)
-        if ok:
-            processed += 1
-            if did_change:
-                changed += 1
+    with ThreadPoolExecutor(max_workers=CHECK_WORKERS) as executor:
+        futures = [
+            executor.submit(check_contract_update, message.chat.id, number,
+                            silent=True, hashes_map=hashes_map, today=today)
+            for number in contract_numbers
+        ]
+        for fut in as_completed(futures):
+            ok, did_change = fut.result()
+            if ok:
+                processed += 1
+                if did_change:
+                    changed += 1
     bot.send_message(message.chat.id, f"✅ Проверка завершена. Всего: {processed}, с изменениями: {changed}")
 
 @bot.message_handler(commands=['add_contracts'])
@@ -1863,7 +2307,7 @@ def process_ai_analysis(message):
             url = user_input
             
             # Получаем данные
-            data = fetch_contract_data_via_ssh(url)
+            data = fetch_contract_data_cached(url)
             if not data or "error" in data:
                 bot.send_message(chat_id, f"❌ Не удалось получить данные контракта: {data.get('error', 'Unknown error') if data else 'No data'}")
                 return
@@ -1884,10 +2328,10 @@ def process_ai_analysis(message):
             service = analysis_result.get('service', 'unknown')
             
             # Форматируем ответ
-            response = f"🤖 **AI Анализ Контракта**\\n\\n"
-            response += f"📋 Контракт: `{data.get('reestr_number', 'N/A')}`\\n"
-            response += f"💰 Цена: {data.get('price', 'N/A')}\\n\\n"
-            response += f"📊 **Анализ:**\\n{analysis}\\n\\n"
+            response = f"🤖 **AI Анализ Контракта**\n\n"
+            response += f"📋 Контракт: `{data.get('reestr_number', 'N/A')}`\n"
+            response += f"💰 Цена: {data.get('price', 'N/A')}\n\n"
+            response += f"📊 **Анализ:**\n{analysis}\n\n"
             response += f"🔧 *Сервис: {service}*"
             
             bot.send_message(chat_id, response, parse_mode='Markdown')
@@ -1898,8 +2342,36 @@ def process_ai_analysis(message):
         logging.error(f"AI analysis error: {e}")
         bot.send_message(chat_id, f"❌ Ошибка AI анализа: {str(e)}")
 
+def run_webhook():
+    """
+    Serves Telegram updates pushed to WEBHOOK_URL with a small Flask app.
+    Updates are handed to the bot's worker pool, so the request returns at once.
+    """
+    from flask import Flask, request, abort
+    from urllib.parse import urlparse
+
+    app = Flask(__name__)
+    path = urlparse(WEBHOOK_URL).path or "/"
+
+    @app.route(path, methods=['POST'])
+    def telegram_webhook():
+        if WEBHOOK_SECRET and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != WEBHOOK_SECRET:
+            abort(403)
+        update = types.Update.de_json(request.get_data().decode('utf-8'))
+        bot.process_new_updates([update])
+        return ''
+
+    bot.remove_webhook()
+    bot.set_webhook(url=WEBHOOK_URL, secret_token=WEBHOOK_SECRET, drop_pending_updates=True)
+    app.run(host=WEBHOOK_HOST, port=WEBHOOK_PORT)
+
 if __name__ == '__main__':
     logging.info("Бот запущен...")
+    init_db()
+    try:
+        get_master_sheet()
+    except Exception as e:
+        logging.warning(f"Failed to open master sheet at startup: {e}")
     # Increase Telegram API timeouts for unstable networks
     try:
         from telebot import apihelper
@@ -1908,10 +2380,13 @@ if __name__ == '__main__':
     except Exception as e:
         logging.warning(f"Failed to set Telegram timeouts: {e}")
 
-    # Resilient polling loop
-    while True:
-        try:
-            bot.infinity_polling(timeout=30, long_polling_timeout=30)
-        except Exception as e:
-            logging.error(f"Polling crashed: {e}")
-            time.sleep(5)
+    if WEBHOOK_URL:
+        run_webhook()
+    else:
+        # Resilient polling loop
+        while True:
+            try:
+                bot.infinity_polling(timeout=50, long_polling_timeout=50, skip_pending=True)
+            except Exception as e:
+                logging.error(f"Polling crashed: {e}")
+                time.sleep(5)
@@ -0,0 +1,86 @@
+import re
+import time
+import asyncio
+from playwright.async_api import async_playwright
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+BLOCKED_RESOURCE_TYPES = {"image", "font", "stylesheet", "media"}
+TRACKERS_RE = re.compile(r"(google-analytics|googletagmanager|yandex\.ru/metrika|mc\.yandex)")
+
+
+async def block_heavy_resources(context, resource_types=BLOCKED_RESOURCE_TYPES):
+    """
+    Aborts requests for resources the scrapers never read (images, fonts, CSS, media, trackers).
+    """
+    await context.route(
+        "**/*",
+        lambda route: route.abort()
+        if route.request.resource_type in resource_types
+        else route.continue_(),
+    )
+    await context.route(TRACKERS_RE, lambda route: route.abort())
+
+
+class AsyncTokenBucket:
+    """
+    Event-loop token bucket: allows bursts of `capacity` requests,
+    then one request per 1/rate seconds.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class BrowserPool:
+    """
+    Keeps one Playwright driver and one headless Chromium alive per process.
+    Callers get a cheap fresh context per task instead of launching a browser.
+    """
+    def __init__(self):
+        self._playwright = None
+        self._browser = None
+        self._lock = None
+
+    async def get_playwright(self):
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        return self._playwright
+
+    async def get_browser(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._browser is None:
+                playwright = await self.get_playwright()
+                self._browser = await playwright.chromium.launch(headless=True)
+        return self._browser
+
+    async def get_context(self, **kwargs):
+        browser = await self.get_browser()
+        kwargs.setdefault("user_agent", USER_AGENT)
+        context = await browser.new_context(**kwargs)
+        await block_heavy_resources(context)
+        return context
+
+    async def close(self):
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+
+browser_pool = BrowserPool()
@@ -1,9 +1,12 @@
 #!/usr/bin/env python3
-import sqlite3
-import requests
-import xml.etree.ElementTree as ET
+import asyncio
+import aiohttp
+import io
+from lxml import etree as ET
 import datetime
 import os
+from concurrent.futures import ThreadPoolExecutor
+from db_pool import ThreadConnections
 
 TELEGRAM_TOKEN = os.getenv('TELEGRAM_TOKEN')
 RSS_NOTIFY_CHAT_ID = os.getenv('RSS_NOTIFY_CHAT_ID')
@@ -11,10 +14,19 @@ RSS_NOTIFY_CHAT_ID = os.getenv('RSS_NOTIFY_CHAT_ID')
 RSS_TRIGGER_PARSE = os.getenv('RSS_TRIGGER_PARSE', 'true').lower() == 'true'
 
 DB_PATH = 'food.db'
+RSS_TIMEOUT = 30
+RSS_MAX_CONNECTIONS = 20
+RSS_KEEPALIVE = 30
+RSS_MAX_RETRIES = 2
+RSS_PARSE_WORKERS = 4
+
+
+# This thread's SQLite connection
+_conn = ThreadConnections(DB_PATH).get
 
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
+    conn = _conn()
     cur = conn.cursor()
     cur.execute('''
         CREATE TABLE IF NOT EXISTS rss_state (
@@ -37,55 +49,105 @@ def init_db():
         )
     ''')
     conn.commit()
-    conn.close()
 
 
 def get_contracts():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+    cur = _conn().cursor()
     cur.execute("SELECT reestr_number, feed_url, last_guid FROM rss_state")
-    rows = cur.fetchall()
-    conn.close()
-    return rows
-
-
-def update_state(reestr_number, last_guid, last_pubdate):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE rss_state SET last_guid=?, last_pubdate=?, last_checked=? WHERE reestr_number=?",
-        (last_guid, last_pubdate, datetime.datetime.utcnow().isoformat(), reestr_number)
+    return cur.fetchall()
+
+
+def update_states(cur, rows):
+    """
+    rows: (reestr_number, feed_url, last_guid, last_pubdate, last_checked) tuples.
+    """
+    cur.executemany(
+        "INSERT INTO rss_state (reestr_number, feed_url, last_guid, last_pubdate, last_checked) "
+        "VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(reestr_number) DO UPDATE SET "
+        "last_guid=excluded.last_guid, last_pubdate=excluded.last_pubdate, last_checked=excluded.last_checked",
+        rows
     )
-    conn.commit()
-    conn.close()
 
 
-def add_event(reestr_number, guid, pubdate, title, link):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute(
+def add_events(cur, rows):
+    """
+    rows: (reestr_number, guid, pubdate, title, link) tuples.
+    """
+    cur.executemany(
         "INSERT INTO rss_events (reestr_number, guid, pubdate, title, link, created_at) VALUES (?, ?, ?, ?, ?, datetime('now'))",
-        (reestr_number, guid, pubdate, title, link)
+        rows
     )
-    conn.commit()
-    conn.close()
 
 
-def parse_rss(xml_text):
-    root = ET.fromstring(xml_text)
-    channel = root.find('channel')
-    if channel is None:
-        return []
+def save_results(state_rows, event_rows):
+    """
+    Writes all state updates and events of one run in a single transaction.
+    """
+    conn = _conn()
+    conn.execute('PRAGMA synchronous=NORMAL')
+    with conn:
+        cur = conn.cursor()
+        add_events(cur, event_rows)
+        update_states(cur, state_rows)
+
+
+def parse_rss(xml_bytes):
+    """
+    Streams <item> elements out of an RSS document, clearing each one after use.
+    """
     items = []
-    for item in channel.findall('item'):
+    for _, item in ET.iterparse(io.BytesIO(xml_bytes), tag='item'):
         guid = (item.findtext('guid') or '').strip()
         title = (item.findtext('title') or '').strip()
         link = (item.findtext('link') or '').strip()
         pubdate = (item.findtext('pubDate') or '').strip()
         items.append({'guid': guid, 'title': title, 'link': link, 'pubdate': pubdate})
+        item.clear()
     return items
 
 
+async def fetch_feed(session, row):
+    # Connection failures are retried; the pooled connections make retries cheap
+    for attempt in range(RSS_MAX_RETRIES + 1):
+        try:
+            async with session.get(row[1]) as resp:
+                return row, resp.status, await resp.read()
+        except aiohttp.ClientConnectionError:
+            if attempt == RSS_MAX_RETRIES:
+                raise
+
+
+async def fetch_all_feeds(rows):
+    """
+    Fetches all feeds concurrently on one event loop.
+    Returns one (row, status, body) tuple or exception per row, in order.
+    """
+    timeout = aiohttp.ClientTimeout(total=RSS_TIMEOUT)
+    # One session for the whole run: feeds on the same host reuse kept-alive TCP/TLS connections
+    connector = aiohttp.TCPConnector(limit=RSS_MAX_CONNECTIONS, keepalive_timeout=RSS_KEEPALIVE)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        return await asyncio.gather(*(fetch_feed(session, row) for row in rows), return_exceptions=True)
+
+
+def trigger_parse(reestr_number, today):
+    try:
+        from bot import check_contract_update
+        check_contract_update(None, reestr_number, silent=True, today=today)
+        print(f"{reestr_number}: parse triggered")
+    except Exception as e:
+        print(f"{reestr_number}: parse trigger failed: {e}")
+
+
+def trigger_parses(numbers):
+    """
+    Parses contracts with new RSS events after all feeds are processed.
+    """
+    today = datetime.date.today().isoformat()
+    with ThreadPoolExecutor(RSS_PARSE_WORKERS) as ex:
+        list(ex.map(lambda n: trigger_parse(n, today), numbers))
+
+
 def main():
     init_db()
     rows = get_contracts()
@@ -93,24 +155,31 @@ def main():
         print('No RSS feeds in db')
         return
 
-    for reestr_number, feed_url, last_guid in rows:
-        if not feed_url:
-            continue
+    rows = [row for row in rows if row[1]]
+    results = asyncio.run(fetch_all_feeds(rows))
+    now = datetime.datetime.utcnow().isoformat()
+    state_rows = []
+    event_rows = []
+    to_parse = []
+
+    for (reestr_number, feed_url, last_guid), result in zip(rows, results):
         try:
-            resp = requests.get(feed_url, timeout=30)
-            if resp.status_code != 200:
-                print(f"{reestr_number}: RSS status {resp.status_code}")
+            if isinstance(result, BaseException):
+                raise result
+            _, status, body = result
+            if status != 200:
+                print(f"{reestr_number}: RSS status {status}")
                 continue
-            items = parse_rss(resp.text)
+            items = parse_rss(body)
             if not items:
                 continue
             latest = items[0]
             if last_guid and latest['guid'] == last_guid:
-                update_state(reestr_number, last_guid, latest['pubdate'])
+                state_rows.append((reestr_number, feed_url, last_guid, latest['pubdate'], now))
                 continue
             # new event
-            add_event(reestr_number, latest['guid'], latest['pubdate'], latest['title'], latest['link'])
-            update_state(reestr_number, latest['guid'], latest['pubdate'])
+            event_rows.append((reestr_number, latest['guid'], latest['pubdate'], latest['title'], latest['link']))
+            state_rows.append((reestr_number, feed_url, latest['guid'], latest['pubdate'], now))
             print(f"{reestr_number}: NEW -> {latest['title']}")
 
             if RSS_NOTIFY_CHAT_ID and TELEGRAM_TOKEN:
@@ -129,15 +198,14 @@ def main():
                     print(f"{reestr_number}: notify failed: {e}")
 
             if RSS_TRIGGER_PARSE:
-                try:
-                    from bot import check_contract_update
-                    check_contract_update(None, reestr_number, silent=True)
-                    print(f"{reestr_number}: parse triggered")
-                except Exception as e:
-                    print(f"{reestr_number}: parse trigger failed: {e}")
+                to_parse.append(reestr_number)
         except Exception as e:
             print(f"{reestr_number}: RSS error {e}")
 
+    save_results(state_rows, event_rows)
+    if to_parse:
+        trigger_parses(to_parse)
+
 
 if __name__ == '__main__':
     main()
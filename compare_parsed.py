@@ -1,16 +1,31 @@
 #!/usr/bin/env python3
 import os
 import json
-import sqlite3
 import re
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from db_pool import ThreadConnections
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 DB_PATH = os.getenv('FOOD_DB_PATH', 'food.db')
 PARSED_ROOT = os.getenv('PARSED_ROOT', 'parsed')
+READ_WORKERS = 8
+
+# Single-char cleanup in one pass; comma decimals become dots
+_NUM_TRANS = str.maketrans({'\xa0': ' ', '₽': '', ',': '.'})
+_NUMS_RE = re.compile(r"\d[\d\s]*\.?\d*")
+
+
+# This thread's SQLite connection
+_conn = ThreadConnections(DB_PATH).get
 
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
+    conn = _conn()
     cur = conn.cursor()
     cur.execute('''
         CREATE TABLE IF NOT EXISTS compare_reports (
@@ -22,33 +37,42 @@ def init_db():
         )
     ''')
     conn.commit()
-    conn.close()
 
 
 def find_numbers(text):
     if not text:
         return []
-    text = text.replace('\xa0', ' ').replace('₽', '').replace('RUB', '')
-    text = re.sub(r'\s+', ' ', text)
-    nums = re.findall(r"\d+[\d\s]*[\.,]?\d*", text)
+    text = text.translate(_NUM_TRANS).replace('RUB', '')
     cleaned = []
-    for n in nums:
-        val = n.replace(' ', '').replace(',', '.')
+    for tok in _NUMS_RE.finditer(text):
         try:
-            cleaned.append(float(val))
-        except Exception:
+            cleaned.append(float(''.join(tok.group().split())))
+        except ValueError:
             continue
     return cleaned
 
 
+def _read_bytes(path):
+    try:
+        return path.read_bytes()
+    except OSError:
+        return None
+
+
 def load_parsed(reestr_number):
     root = Path(PARSED_ROOT) / reestr_number
     if not root.exists():
         return []
+    paths = list(root.rglob('*.json'))
+    # Reads overlap on disk; parsing stays on this thread
+    with ThreadPoolExecutor(READ_WORKERS) as ex:
+        blobs = list(ex.map(_read_bytes, paths))
     data = []
-    for p in root.rglob('*.json'):
+    for p, raw in zip(paths, blobs):
+        if raw is None:
+            continue
         try:
-            obj = json.loads(p.read_text(encoding='utf-8'))
+            obj = orjson.loads(raw) if orjson else json.loads(raw.decode('utf-8'))
             obj['_path'] = str(p)
             data.append(obj)
         except Exception:
@@ -57,17 +81,16 @@ def load_parsed(reestr_number):
 
 
 def summarize(parsed):
-    summary = []
-    for obj in parsed:
-        text = obj.get('text') or ''
-        numbers = find_numbers(text)
-        summary.append({
+    numbers_per_file = [find_numbers(obj.get('text') or '') for obj in parsed]
+    return [
+        {
             'file': obj.get('file'),
             'type': obj.get('type'),
             'numbers_count': len(numbers),
             'sample_numbers': numbers[:20]
-        })
-    return summary
+        }
+        for obj, numbers in zip(parsed, numbers_per_file)
+    ]
 
 
 def compare(reestr_number):
@@ -89,16 +112,18 @@ def compare(reestr_number):
 
     report_path = Path(PARSED_ROOT) / reestr_number / 'compare_report.json'
     report_path.parent.mkdir(parents=True, exist_ok=True)
-    report_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    if orjson:
+        report_path.write_bytes(orjson.dumps(report, option=orjson.OPT_INDENT_2))
+    else:
+        report_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
 
-    conn = sqlite3.connect(DB_PATH)
+    conn = _conn()
     cur = conn.cursor()
     cur.execute(
         "INSERT INTO compare_reports (reestr_number, report_path, status, created_at) VALUES (?, ?, ?, datetime('now'))",
         (reestr_number, str(report_path), 'created')
     )
     conn.commit()
-    conn.close()
 
     return report_path
 
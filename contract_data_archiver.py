@@ -10,6 +10,8 @@ import datetime
 import re
 from pathlib import Path
 
+_NUM_RE = re.compile(r"(\d+\.?\d*)")
+
 def clean_number(value_str):
     if not value_str:
         return 0.0
@@ -18,7 +20,7 @@ def clean_number(value_str):
     line = line.replace("₽", "").replace("RUB", "")
     line = line.replace("Ставка НДС: 20%", "").replace("Ставка НДС: Без НДС", "")
     line = line.replace(" ", "").replace("\t", "").replace(",", ".")
-    match = re.search(r"(\\d+\\.?\\d*)", line)
+    match = _NUM_RE.search(line)
     if not match:
         return 0.0
     try:
@@ -81,32 +83,50 @@ def save_debug_data(data, contract_number, pdf_path=None, screenshot_path=None):
     return str(debug_dir)
 
 def aggregate_contracts_data(contracts_data):
-    """Aggregate data from multiple contracts"""
+    """Aggregate data from multiple contracts (single pass over contracts_data)"""
+    count = len(contracts_data)
+    zero_price_count = 0
+    total_value = 0
+    total_objects = 0
+    total_paid = 0
+    total_accepted = 0
+    categories = set()
+    for c in contracts_data:
+        price = c.get('price_clean', 0)
+        if price <= 0:
+            zero_price_count += 1
+        total_value += price
+        objects = c.get('objects', [])
+        total_objects += len(objects)
+        categories.update(obj.get('category', 'Unknown') for obj in objects)
+        execution = c.get('execution', {})
+        total_paid += execution.get('paid_clean', 0)
+        total_accepted += execution.get('accepted_clean', 0)
+
+    if count:
+        average_price = total_value / count
+        average_objects = total_objects / count
+    else:
+        average_price = average_objects = 0
+
     report = {
         "timestamp": datetime.datetime.now().isoformat(),
-        "total_contracts": len(contracts_data),
+        "total_contracts": count,
         "price_statistics": {
-            "zero_price_count": sum(1 for c in contracts_data if c.get('price_clean', 0) <= 0),
-            "successful_price_count": sum(1 for c in contracts_data if c.get('price_clean', 0) > 0),
-            "average_price": sum(c.get('price_clean', 0) for c in contracts_data) / len(contracts_data) if contracts_data else 0,
-            "total_value": sum(c.get('price_clean', 0) for c in contracts_data)
+            "zero_price_count": zero_price_count,
+            "successful_price_count": count - zero_price_count,
+            "average_price": average_price,
+            "total_value": total_value
         },
         "object_statistics": {
-            "total_objects": sum(len(c.get('objects', [])) for c in contracts_data),
-            "average_objects_per_contract": sum(len(c.get('objects', [])) for c in contracts_data) / len(contracts_data) if contracts_data else 0,
-            "categories_found": list(set(
-                obj.get('category', 'Unknown') 
-                for c in contracts_data 
-                for obj in c.get('objects', [])
-            ))
+            "total_objects": total_objects,
+            "average_objects_per_contract": average_objects,
+            "categories_found": list(categories)
         },
         "execution_statistics": {
-            "total_paid": sum(c.get('execution', {}).get('paid_clean', 0) for c in contracts_data),
-            "total_accepted": sum(c.get('execution', {}).get('accepted_clean', 0) for c in contracts_data),
-            "total_limit_remaining": sum(
-                c.get('price_clean', 0) - c.get('execution', {}).get('accepted_clean', 0) 
-                for c in contracts_data
-            )
+            "total_paid": total_paid,
+            "total_accepted": total_accepted,
+            "total_limit_remaining": total_value - total_accepted
         },
         "contracts": contracts_data
     }
@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 import os
+import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
-from bot import init_db, get_contract_numbers_from_db, check_contract_update
+from bot import init_db, get_contract_numbers_from_db, load_all_hashes, check_contract_update, CHECK_WORKERS
 
 load_dotenv()
 
@@ -12,14 +14,22 @@ def main():
         print("Registry is empty. Nothing to check.")
         return
 
+    hashes_map = load_all_hashes()
+    today = datetime.date.today().isoformat()
     processed = 0
     changed = 0
-    for number in numbers:
-        ok, did_change = check_contract_update(None, number, silent=True)
-        if ok:
-            processed += 1
-            if did_change:
-                changed += 1
+    with ThreadPoolExecutor(max_workers=CHECK_WORKERS) as executor:
+        futures = [
+            executor.submit(check_contract_update, None, number,
+                            silent=True, hashes_map=hashes_map, today=today)
+            for number in numbers
+        ]
+        for fut in as_completed(futures):
+            ok, did_change = fut.result()
+            if ok:
+                processed += 1
+                if did_change:
+                    changed += 1
     print(f"Done. Total: {processed}, changed: {changed}")
 
 if __name__ == '__main__':
@@ -0,0 +1,32 @@
+import sqlite3
+import threading
+import atexit
+
+
+class ThreadConnections:
+    """
+    One SQLite connection per thread for db_path, opened on first use
+    in WAL mode and closed at interpreter exit.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._tls = threading.local()
+        self._all = []
+        self._lock = threading.Lock()
+        atexit.register(self.close_all)
+
+    def get(self):
+        conn = getattr(self._tls, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._tls.conn = conn
+            with self._lock:
+                self._all.append(conn)
+        return conn
+
+    def close_all(self):
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all.clear()
@@ -3,43 +3,78 @@ import sys
 import os
 import json
 import re
+import string
 import asyncio
 from urllib.parse import urljoin, urlparse, unquote
-from playwright.async_api import async_playwright
+from browser_pool import browser_pool, USER_AGENT
 
 ALLOWED_EXTENSIONS = {
     ".pdf", ".doc", ".docx", ".xls", ".xlsx",
     ".xml", ".html", ".htm", ".zip", ".rar"
 }
 
+# str.endswith takes a tuple and checks every suffix in one call
+_ALLOWED_EXT_TUPLE = tuple(sorted(ALLOWED_EXTENSIONS, key=len, reverse=True))
+
 FILestore_HINTS = [
     "/filestore/public/",
     "/filestore/",
     "download/rgk2/file.html?uid=",
 ]
 
+HTTP_HEADERS = {"Accept-Language": "ru-RU,ru;q=0.9"}
+# Anchors whose href already looks like an attachment; navigation links never leave the browser
+ATTACHMENT_ANCHOR_SELECTOR = "a[href*='filestore'], a[href*='attachmentId'], a[href*='/download/']"
+MAX_PARALLEL_DOWNLOADS = 8
+# Cookies/anti-bot tokens from zakupki.gov.ru, reused across runs
+STATE_PATH = os.getenv("ZAKUPKI_STATE_PATH", "zakupki_state.json")
+
+_RE_ATTACH_ID = re.compile(r"attachmentId=(\d+)")
+_RE_FILESTORE = re.compile(r"https?://[^\"'\s]+/filestore/public/[^\"'\s]+")
+_RE_CD_UTF8 = re.compile(r"filename\*=UTF-8''([^;]+)")
+_RE_CD_PLAIN = re.compile(r'filename="?([^";]+)"?')
+_RE_UID = re.compile(r"uid=([A-Fa-f0-9]+)")
+_RE_CONTRACT_INFO = re.compile(r"contractInfoId=(\d+)")
+# FILestore_HINTS plus attachmentId= and /download/, in one case-insensitive scan
+_RE_ATTACH_HINT = re.compile(
+    "|".join(map(re.escape, FILestore_HINTS + ["attachmentid=", "/download/"])), re.IGNORECASE
+)
+
 
 def is_attachment_url(href: str) -> bool:
     if not href:
         return False
-    lower = href.lower()
-    if any(hint in lower for hint in FILestore_HINTS):
-        return True
-    if "attachmentid=" in lower:
-        return True
-    if "/download/" in lower:
+    if _RE_ATTACH_HINT.search(href):
         return True
+    lower = href.lower()
     # Fallback: only accept direct file URLs from filestore
-    if "/filestore/" in lower and any(lower.endswith(ext) for ext in ALLOWED_EXTENSIONS):
+    if "/filestore/" in lower and lower.endswith(_ALLOWED_EXT_TUPLE):
         return True
     return False
 
 
+class _FilenameTable(dict):
+    """
+    str.translate table: allowed characters map to themselves, everything
+    else (including non-ASCII) to "_". Entries are filled in on first use.
+    """
+    def __missing__(self, codepoint):
+        char = chr(codepoint)
+        value = char if char in _FILENAME_ALLOWED else "_"
+        self[codepoint] = value
+        return value
+
+
+_FILENAME_ALLOWED = frozenset(string.ascii_letters + string.digits + "_.() -")
+_FILENAME_TABLE = _FilenameTable()
+_WS_RE = re.compile(r"\s+")
+
+
 def sanitize_filename(name: str) -> str:
     name = name.strip().replace("\n", " ")
-    name = re.sub(r"\s+", " ", name)
+    name = _WS_RE.sub(" ", name)
     # Replace filesystem-unfriendly characters
-    name = re.sub(r"[^A-Za-z0-9_.() -]", "_", name)
+    name = name.translate(_FILENAME_TABLE)
     if not name:
         return "file"
     return name
@@ -60,10 +95,10 @@ def filename_from_headers(headers):
     cd = headers.get("content-disposition") or headers.get("Content-Disposition")
     if not cd:
         return None
-    match = re.search(r'filename\\*=UTF-8\\\'\\\'([^;]+)', cd)
+    match = _RE_CD_UTF8.search(cd)
     if match:
         return sanitize_filename(unquote(match.group(1)))
-    match = re.search(r'filename=\"?([^\";]+)\"?', cd)
+    match = _RE_CD_PLAIN.search(cd)
     if match:
         return sanitize_filename(unquote(match.group(1)))
     return None
@@ -86,6 +121,20 @@ def extension_from_content_type(headers):
     return mapping.get(ct, "")
 
 
+def unique_matches(regex, text, group=0):
+    """
+    Distinct matches in first-seen order, deduplicated while scanning.
+    """
+    seen = set()
+    out = []
+    for m in regex.finditer(text):
+        value = m.group(group)
+        if value not in seen:
+            seen.add(value)
+            out.append(value)
+    return out
+
+
 def normalize_url(href: str, base_url: str) -> str:
     if href.startswith("http://") or href.startswith("https://"):
         return href
@@ -94,31 +143,104 @@ def normalize_url(href: str, base_url: str) -> str:
 
 async def collect_links(page, url):
     await page.goto(url, timeout=60000, wait_until="domcontentloaded")
-    await page.wait_for_timeout(2000)
-    anchors = page.locator("a")
-    count = await anchors.count()
-    links = []
-    for i in range(count):
-        a = anchors.nth(i)
-        href = await a.get_attribute("href")
-        text = ""
-        try:
-            text = (await a.inner_text()) if await a.count() > 0 else ""
-        except Exception:
-            text = ""
-        if href:
-            links.append((href, text))
-    return links
+    # One in-page evaluation instead of several CDP round trips per anchor
+    anchors = await page.eval_on_selector_all(
+        ATTACHMENT_ANCHOR_SELECTOR, "els => els.map(a => [a.getAttribute('href'), a.innerText || ''])"
+    )
+    return [(href, text) for href, text in anchors if href]
 
 async def collect_attachment_ids(page):
     html = await page.content()
-    ids = re.findall(r"attachmentId=(\\d+)", html)
-    return list(dict.fromkeys(ids))
+    return unique_matches(_RE_ATTACH_ID, html, 1)
 
 async def collect_filestore_links(page):
     html = await page.content()
-    links = re.findall(r"https?://[^\\\"'\\s]+/filestore/public/[^\\\"'\\s]+", html)
-    return list(dict.fromkeys(links))
+    return unique_matches(_RE_FILESTORE, html)
+
+
+def stored_state():
+    """
+    Path of the saved storage state, or None on the first run.
+    """
+    return STATE_PATH if os.path.exists(STATE_PATH) else None
+
+
+async def render_html(url, marker=None):
+    """
+    Fallback for pages whose HTML is only produced by JavaScript.
+    Waits until marker appears in the DOM instead of sleeping a fixed time.
+    """
+    context = await browser_pool.get_context(storage_state=stored_state())
+    try:
+        page = await context.new_page()
+        await page.goto(url, timeout=60000, wait_until="domcontentloaded")
+        if marker:
+            try:
+                await page.wait_for_function(
+                    "m => document.documentElement.outerHTML.includes(m)", arg=marker, timeout=5000
+                )
+            except Exception:
+                pass
+        return await page.content()
+    finally:
+        await context.close()
+
+
+async def fetch_html(api, url, marker=None):
+    """
+    Fetches page HTML over plain HTTP, rendering it in Chromium only if the response is empty.
+    """
+    resp = await api.get(url, timeout=60000)
+    html = await resp.text() if resp.ok else ""
+    if not html.strip():
+        html = await render_html(url, marker)
+    return html
+
+
+async def download_one(api, m_url, download_dir):
+    uid_match = _RE_UID.search(m_url)
+    if uid_match:
+        filename = f"{uid_match.group(1)}"
+    else:
+        filename = guess_filename(m_url, "", 0)
+    path = os.path.join(download_dir, filename)
+    try:
+        resp = None
+        for attempt in range(3):
+            resp = await api.get(m_url)
+            if resp.status == 429:
+                await asyncio.sleep(1.5 * (attempt + 1))
+                continue
+            break
+        if not resp or resp.status != 200:
+            return {"url": m_url, "status": resp.status if resp else None, "error": "download_failed"}
+        headers = resp.headers
+        real_name = filename_from_headers(headers)
+        if real_name:
+            filename = real_name
+            path = os.path.join(download_dir, filename)
+        else:
+            ext = extension_from_content_type(headers)
+            if ext and not filename.endswith(ext):
+                filename = f"{filename}{ext}"
+                path = os.path.join(download_dir, filename)
+        data = await resp.body()
+        # Disk writes go to a worker thread so other downloads keep running
+        await asyncio.to_thread(write_file, path, data)
+        return {
+            "url": m_url,
+            "file_name": filename,
+            "path": path,
+            "size": len(data),
+            "status": 200
+        }
+    except Exception as e:
+        return {"url": m_url, "error": str(e)}
+
+
+def write_file(path, data):
+    with open(path, "wb") as f:
+        f.write(data)
 
 
 async def main():
@@ -134,79 +256,41 @@ async def main():
 
     results = []
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        )
-        page = await context.new_page()
-
+    # Contract pages are server-rendered, so plain HTTP returns the HTML we scrape
+    playwright = await browser_pool.get_playwright()
+    api = await playwright.request.new_context(
+        user_agent=USER_AGENT, extra_http_headers=HTTP_HEADERS, storage_state=stored_state()
+    )
+
+    try:
+        base_url = f"https://zakupki.gov.ru/epz/contract/contractCard/common-info.html?reestrNumber={reestr_number}"
+        base_html = await fetch_html(api, base_url, "contractInfoId=")
+
+        m = _RE_CONTRACT_INFO.search(base_html)
+        contract_info_id = m.group(1) if m else None
+        if contract_info_id:
+            doc_url = f"https://zakupki.gov.ru/epz/contract/contractCard/document-info.html?reestrNumber={reestr_number}&contractInfoId={contract_info_id}"
+        else:
+            doc_url = f"https://zakupki.gov.ru/epz/contract/contractCard/document-info.html?reestrNumber={reestr_number}"
+        doc_html = await fetch_html(api, doc_url, "/filestore/public/")
         try:
-            base_url = f"https://zakupki.gov.ru/epz/contract/contractCard/common-info.html?reestrNumber={reestr_number}"
-            await page.goto(base_url, timeout=60000, wait_until="domcontentloaded")
-            await page.wait_for_timeout(2000)
-            base_html = await page.content()
-
-            m = re.search(r"contractInfoId=(\\d+)", base_html)
-            contract_info_id = m.group(1) if m else None
-            if contract_info_id:
-                doc_url = f"https://zakupki.gov.ru/epz/contract/contractCard/document-info.html?reestrNumber={reestr_number}&contractInfoId={contract_info_id}"
-            else:
-                doc_url = f"https://zakupki.gov.ru/epz/contract/contractCard/document-info.html?reestrNumber={reestr_number}"
-            await page.goto(doc_url, timeout=60000, wait_until="domcontentloaded")
-            await page.wait_for_timeout(2000)
-            doc_html = await page.content()
-
-            filestore_links = re.findall(r"https?://[^\\\"'\\s]+/filestore/public/[^\\\"'\\s]+", doc_html)
-            filestore_links = list(dict.fromkeys(filestore_links))
-
-            seen = set()
-            for m_url in filestore_links:
-                if m_url in seen:
-                    continue
-                seen.add(m_url)
-                uid_match = re.search(r"uid=([A-Fa-f0-9]+)", m_url)
-                if uid_match:
-                    filename = f"{uid_match.group(1)}"
-                else:
-                    filename = guess_filename(m_url, "", 0)
-                path = os.path.join(download_dir, filename)
-                try:
-                    resp = None
-                    for attempt in range(3):
-                        resp = await context.request.get(m_url)
-                        if resp.status == 429:
-                            await page.wait_for_timeout(1500 * (attempt + 1))
-                            continue
-                        break
-                    if not resp or resp.status != 200:
-                        results.append({"url": m_url, "status": resp.status if resp else None, "error": "download_failed"})
-                        continue
-                    headers = resp.headers
-                    real_name = filename_from_headers(headers)
-                    if real_name:
-                        filename = real_name
-                        path = os.path.join(download_dir, filename)
-                    else:
-                        ext = extension_from_content_type(headers)
-                        if ext and not filename.endswith(ext):
-                            filename = f"{filename}{ext}"
-                            path = os.path.join(download_dir, filename)
-                    data = await resp.body()
-                    with open(path, "wb") as f:
-                        f.write(data)
-                    results.append({
-                        "url": m_url,
-                        "file_name": filename,
-                        "path": path,
-                        "size": len(data),
-                        "status": 200
-                    })
-                except Exception as e:
-                    results.append({"url": m_url, "error": str(e)})
-
-        finally:
-            await browser.close()
+            await api.storage_state(path=STATE_PATH)
+        except Exception:
+            pass
+
+        filestore_links = unique_matches(_RE_FILESTORE, doc_html)
+
+        sem = asyncio.Semaphore(MAX_PARALLEL_DOWNLOADS)
+
+        async def download_limited(m_url):
+            async with sem:
+                return await download_one(api, m_url, download_dir)
+
+        results = await asyncio.gather(*(download_limited(u) for u in filestore_links))
+
+    finally:
+        await api.dispose()
+        await browser_pool.close()
 
     print(json.dumps({"reestr_number": reestr_number, "files": results}, ensure_ascii=False))
 
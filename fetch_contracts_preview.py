@@ -2,11 +2,52 @@ import sys
 import asyncio
 import json
 import re
-from playwright.async_api import async_playwright
+from browser_pool import browser_pool, AsyncTokenBucket
 
-async def fetch_contract_preview(contract_number):
+MAX_PARALLEL = 6
+# Page loads against zakupki.gov.ru: bursts of 10, then 10 per second
+_page_limiter = AsyncTokenBucket(rate=10, capacity=10)
+ALL_FIELDS = {"year", "customer", "price"}
+_RE_YEAR = re.compile(r"(\d{4})")
+
+
+def year_from_number(contract_number):
+    """
+    Signing year encoded in the registry number (digits 15-16), if plausible.
+    """
+    if len(contract_number) < 19 or not contract_number[14:16].isdigit():
+        return None
+    potential_year = "20" + contract_number[14:16]
+    if 2020 <= int(potential_year) <= 2030:
+        return potential_year
+    return None
+
+
+def parse_args(argv):
+    """
+    Returns (numbers_str, fields). Usage: <numbers> [--fields year,customer,price]
     """
-    Fetches basic preview information for a single contract.
+    fields = set(ALL_FIELDS)
+    args = []
+    i = 0
+    while i < len(argv):
+        if argv[i] == "--fields" and i + 1 < len(argv):
+            fields = {f.strip() for f in argv[i + 1].split(",") if f.strip()} & ALL_FIELDS
+            i += 2
+            continue
+        if argv[i].startswith("--fields="):
+            fields = {f.strip() for f in argv[i].split("=", 1)[1].split(",") if f.strip()} & ALL_FIELDS
+            i += 1
+            continue
+        args.append(argv[i])
+        i += 1
+    return (args[0] if args else None), (fields or set(ALL_FIELDS))
+
+
+async def fetch_contract_preview(context, contract_number):
+    """
+    Fetches basic preview information for a single contract
+    in a new page of the shared browser context.
     """
     url = f"https://zakupki.gov.ru/epz/contract/contractCard/common-info.html?reestrNumber={contract_number}"
     
@@ -18,104 +59,95 @@ async def fetch_contract_preview(contract_number):
         "status": "unknown"
     }
     
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        )
-        page = await context.new_page()
+    page = await context.new_page()
+    try:
+        await _page_limiter.acquire()
+        await page.goto(url, timeout=30000, wait_until="domcontentloaded")
         
+        # Extract customer name
         try:
-            await page.goto(url, timeout=30000, wait_until="domcontentloaded")
-            
-            # Extract customer name
+            customer_element = await page.wait_for_selector('[data-bind="text: customer.fullName"]', timeout=10000)
+            if customer_element:
+                customer = await customer_element.inner_text()
+                result["customer"] = customer.strip()
+        except:
             try:
-                customer_element = await page.wait_for_selector('[data-bind="text: customer.fullName"]', timeout=10000)
+                # Alternative selector
+                customer_element = await page.query_selector('.customer-name, .customer-block__name')
                 if customer_element:
                     customer = await customer_element.inner_text()
                     result["customer"] = customer.strip()
             except:
-                try:
-                    # Alternative selector
-                    customer_element = await page.query_selector('.customer-name, .customer-block__name')
-                    if customer_element:
-                        customer = await customer_element.inner_text()
-                        result["customer"] = customer.strip()
-                except:
-                    pass
-            
-            # Extract price
+                pass
+        
+        # Extract price
+        try:
+            price_element = await page.wait_for_selector('[data-bind="text: price"]', timeout=10000)
+            if price_element:
+                price = await price_element.inner_text()
+                result["price"] = price.strip()
+        except:
             try:
-                price_element = await page.wait_for_selector('[data-bind="text: price"]', timeout=10000)
+                # Alternative selector
+                price_element = await page.query_selector('.price-block__value, .contract-price')
                 if price_element:
                     price = await price_element.inner_text()
                     result["price"] = price.strip()
             except:
-                try:
-                    # Alternative selector
-                    price_element = await page.query_selector('.price-block__value, .contract-price')
-                    if price_element:
-                        price = await price_element.inner_text()
-                        result["price"] = price.strip()
-                except:
-                    pass
-            
-            # Extract dates to determine year
+                pass
+        
+        # Extract dates to determine year
+        try:
+            date_element = await page.wait_for_selector('[data-bind="text: contractSigningDate"]', timeout=10000)
+            if date_element:
+                date_text = await date_element.inner_text()
+                year_match = _RE_YEAR.search(date_text)
+                if year_match:
+                    result["year"] = year_match.group(1)
+        except:
             try:
-                date_element = await page.wait_for_selector('[data-bind="text: contractSigningDate"]', timeout=10000)
-                if date_element:
-                    date_text = await date_element.inner_text()
-                    year_match = re.search(r'(\d{4})', date_text)
-                    if year_match:
-                        result["year"] = year_match.group(1)
+                # Alternative selectors for dates
+                date_selectors = [
+                    '[data-bind="text: executionDateStart"]',
+                    '[data-bind="text: executionDateEnd"]',
+                    '.date-block__start-date',
+                    '.date-block__end-date'
+                ]
+                
+                for selector in date_selectors:
+                    try:
+                        date_element = await page.query_selector(selector)
+                        if date_element:
+                            date_text = await date_element.inner_text()
+                            year_match = _RE_YEAR.search(date_text)
+                            if year_match:
+                                result["year"] = year_match.group(1)
+                                break
+                    except:
+                        continue
             except:
-                try:
-                    # Alternative selectors for dates
-                    date_selectors = [
-                        '[data-bind="text: executionDateStart"]',
-                        '[data-bind="text: executionDateEnd"]',
-                        '.date-block__start-date',
-                        '.date-block__end-date'
-                    ]
-                    
-                    for selector in date_selectors:
-                        try:
-                            date_element = await page.query_selector(selector)
-                            if date_element:
-                                date_text = await date_element.inner_text()
-                                year_match = re.search(r'(\d{4})', date_text)
-                                if year_match:
-                                    result["year"] = year_match.group(1)
-                                    break
-                        except:
-                            continue
-                except:
-                    pass
-            
-            # Fallback year extraction from contract number
-            if not result["year"] and len(contract_number) >= 19:
-                potential_year = "20" + contract_number[14:16]
-                if 2020 <= int(potential_year) <= 2030:
-                    result["year"] = potential_year
-                else:
-                    result["year"] = "2025"  # Default year
-            
-            result["status"] = "found"
-            
-        except Exception as e:
-            result["status"] = f"error: {str(e)}"
-            
-        finally:
-            await browser.close()
+                pass
+        
+        # Fallback year extraction from contract number
+        if not result["year"] and len(contract_number) >= 19:
+            result["year"] = year_from_number(contract_number) or "2025"  # Default year
+        
+        result["status"] = "found"
+        
+    except Exception as e:
+        result["status"] = f"error: {str(e)}"
+        
+    finally:
+        await page.close()
     
     return result
 
 async def main():
-    if len(sys.argv) < 2:
+    numbers_str, fields = parse_args(sys.argv[1:])
+    if not numbers_str:
         print(json.dumps({"error": "No contract numbers provided"}))
         sys.exit(1)
     
-    numbers_str = sys.argv[1]
     contract_numbers = [num.strip() for num in numbers_str.split(',') if num.strip()]
     
     if not contract_numbers:
@@ -124,28 +156,43 @@ async def main():
     
     print(f"Fetching preview for {len(contract_numbers)} contracts...", file=sys.stderr)
     
-    results = []
+    valid_numbers = [n for n in contract_numbers if len(n) >= 19]
     
-    for contract_number in contract_numbers:
-        if len(contract_number) < 19:
-            results.append({
-                "number": contract_number,
-                "status": "invalid: too short"
-            })
-            continue
-            
+    fetched = {}
+    if fields == {"year"}:
+        # Year is encoded in the number; the browser is only needed when it isn't
+        for contract_number in valid_numbers:
+            year = year_from_number(contract_number)
+            if year:
+                fetched[contract_number] = {"number": contract_number, "year": year, "status": "derived"}
+    browser_numbers = [n for n in valid_numbers if n not in fetched]
+    previews = []
+    
+    if browser_numbers:
+        context = await browser_pool.get_context()
+        sem = asyncio.Semaphore(MAX_PARALLEL)
+        
+        async def fetch_limited(contract_number):
+            async with sem:
+                return await fetch_contract_preview(context, contract_number)
+        
         try:
-            preview = await fetch_contract_preview(contract_number)
-            results.append(preview)
-            
-            # Small delay between requests to be respectful
-            await asyncio.sleep(1)
-            
-        except Exception as e:
-            results.append({
-                "number": contract_number,
-                "status": f"error: {str(e)}"
-            })
+            previews = await asyncio.gather(
+                *(fetch_limited(n) for n in browser_numbers), return_exceptions=True
+            )
+        finally:
+            await context.close()
+            await browser_pool.close()
+    
+    for contract_number, preview in zip(browser_numbers, previews):
+        if isinstance(preview, Exception):
+            preview = {"number": contract_number, "status": f"error: {str(preview)}"}
+        fetched[contract_number] = preview
+    
+    results = [
+        fetched[n] if n in fetched else {"number": n, "status": "invalid: too short"}
+        for n in contract_numbers
+    ]
     
     print(json.dumps(results, ensure_ascii=False))
 
@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 import datetime
-from bot import get_gc, get_contract_numbers_from_registry, find_existing_contract_sheet_id
+from concurrent.futures import ThreadPoolExecutor
+from bot import get_gc, get_contract_numbers_from_registry, find_existing_contract_sheet_id, google_write
+
+WORKERS = 8
 
 
 def pick_last_data_sheet(sh):
@@ -38,23 +41,24 @@ def swap_columns(ws):
         header.append("")
     header[1] = "Цена за единицу"
     header[3] = "Кол-во"
-    ws.update("A1:G1", [header[:7]], value_input_option="USER_ENTERED")
-
-    if len(values) < 2:
-        return True
-
-    # Swap columns B and D for rows 2..N
-    col_b = []
-    col_d = []
-    for row in values[1:]:
-        b = row[1] if len(row) > 1 else ""
-        d = row[3] if len(row) > 3 else ""
-        col_b.append([d])
-        col_d.append([b])
-
-    end_row = len(values)
-    ws.update(f"B2:B{end_row}", col_b, value_input_option="USER_ENTERED")
-    ws.update(f"D2:D{end_row}", col_d, value_input_option="USER_ENTERED")
+    data = [{"range": f"'{ws.title}'!A1:G1", "values": [header[:7]]}]
+
+    if len(values) > 1:
+        # Swap columns B and D for rows 2..N
+        col_b = []
+        col_d = []
+        for row in values[1:]:
+            b = row[1] if len(row) > 1 else ""
+            d = row[3] if len(row) > 3 else ""
+            col_b.append([d])
+            col_d.append([b])
+
+        end_row = len(values)
+        data.append({"range": f"'{ws.title}'!B2:B{end_row}", "values": col_b})
+        data.append({"range": f"'{ws.title}'!D2:D{end_row}", "values": col_d})
+
+    # Header and both columns in one request
+    google_write(ws.spreadsheet.values_batch_update, {"valueInputOption": "USER_ENTERED", "data": data})
     return True
 
 
@@ -69,18 +73,22 @@ def main():
         print("Registry is empty")
         return
 
-    fixed = 0
-    for number in numbers:
+    def process_one(number):
         sheet_id = find_existing_contract_sheet_id(number)
         if not sheet_id:
-            continue
+            return False
         sh = gc.open_by_key(sheet_id)
         ws = pick_last_data_sheet(sh)
         if not ws:
-            continue
+            return False
         if swap_columns(ws):
-            fixed += 1
             print(f"Fixed: {number} -> {ws.title}")
+            return True
+        return False
+
+    # Writes share bot.google_write's rate limit and 429 backoff
+    with ThreadPoolExecutor(max_workers=WORKERS) as ex:
+        fixed = sum(ex.map(process_one, numbers))
 
     print(f"Done. Fixed sheets: {fixed}")
 
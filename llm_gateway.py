@@ -1,6 +1,17 @@
 #!/usr/bin/env python3
 import os
+import json
+import hashlib
+import sqlite3
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 BASE_URL = os.getenv('LLM_BASE_URL', 'http://172.86.90.213:3000/v1')
 API_KEY = os.getenv('LLM_API_KEY', '')
@@ -9,6 +20,71 @@ MODEL_FALLBACK = os.getenv('LLM_MODEL_FALLBACK', 'llama-3.3-70b-versatile')
 TIMEOUT = int(os.getenv('LLM_TIMEOUT', '60'))
 OLLAMA_URL = os.getenv('OLLAMA_URL', 'http://localhost:11434/api/generate')
 OLLAMA_MODEL = os.getenv('OLLAMA_MODEL', 'tinyllama')
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', 'llm_cache.db')
+
+
+def make_session():
+    """
+    Pooled session that keeps connections alive between calls and retries
+    connection errors and 429/5xx responses (not read timeouts).
+    """
+    retry = Retry(
+        total=3, read=0, backoff_factor=0.5,
+        status_forcelist=[429, 502, 503, 504],
+        allowed_methods=frozenset({'GET', 'POST'}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_maxsize=16, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+_SESSION = make_session()
+
+def response_json(resp):
+    """
+    Parses a JSON response body, with orjson when it is installed.
+    """
+    if orjson:
+        return orjson.loads(resp.content)
+    return resp.json()
+
+
+_cache_conn = None
+_cache_lock = threading.Lock()
+
+
+def _cache():
+    global _cache_conn
+    if _cache_conn is None:
+        _cache_conn = sqlite3.connect(LLM_CACHE_PATH, check_same_thread=False)
+        _cache_conn.execute("CREATE TABLE IF NOT EXISTS llm_cache (k TEXT PRIMARY KEY, v TEXT)")
+    return _cache_conn
+
+
+def cache_key(model, prompt):
+    return hashlib.blake2b(f"{model}\n{prompt}".encode('utf-8'), digest_size=16).hexdigest()
+
+
+def cache_get(key):
+    """
+    Returns the cached LLM response for key, or None.
+    """
+    with _cache_lock:
+        row = _cache().execute("SELECT v FROM llm_cache WHERE k = ?", (key,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def cache_put(key, value):
+    with _cache_lock:
+        conn = _cache()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (k, v) VALUES (?, ?)",
+            (key, json.dumps(value, ensure_ascii=False))
+        )
+        conn.commit()
 
 
 def _post_chat(payload):
@@ -18,10 +94,10 @@ def _post_chat(payload):
     if API_KEY:
         headers['Authorization'] = f"Bearer {API_KEY}"
     url = f"{BASE_URL}/chat/completions"
-    resp = requests.post(url, headers=headers, json=payload, timeout=TIMEOUT)
+    resp = _SESSION.post(url, headers=headers, json=payload, timeout=TIMEOUT)
     if resp.status_code != 200:
         raise RuntimeError(f"LLM error {resp.status_code}: {resp.text}")
-    return resp.json()
+    return response_json(resp)
 
 def _post_ollama(prompt):
     payload = {
@@ -29,15 +105,34 @@ def _post_ollama(prompt):
         'prompt': prompt,
         'stream': False
     }
-    resp = requests.post(OLLAMA_URL, json=payload, timeout=TIMEOUT)
+    resp = _SESSION.post(OLLAMA_URL, json=payload, timeout=TIMEOUT)
     if resp.status_code != 200:
         raise RuntimeError(f"Ollama error {resp.status_code}: {resp.text}")
-    data = resp.json()
+    data = response_json(resp)
     return data.get('response', '').strip()
 
 
 def chat(messages, model=None):
+    """
+    Chat completion with fallbacks. Responses are memoized on disk
+    by model + messages, so repeated prompts skip the LLM call.
+    """
     model = model or MODEL_PRIMARY
+    key = cache_key(model, json.dumps(messages, ensure_ascii=False, sort_keys=True))
+    cached = cache_get(key)
+    if cached is not None:
+        return cached
+    data, answered_by = _chat_uncached(messages, model)
+    # Fallback answers are not cached, so the requested model is retried next time
+    if answered_by == model:
+        cache_put(key, data)
+    return data
+
+
+def _chat_uncached(messages, model):
+    """
+    Returns (response, model that answered); OLLAMA_MODEL when the gateway failed.
+    """
     payload = {
         'model': model,
         'messages': messages,
@@ -46,12 +141,12 @@ def chat(messages, model=None):
     }
     try:
         data = _post_chat(payload)
-        return data
+        return data, model
     except Exception:
         if model != MODEL_FALLBACK:
             payload['model'] = MODEL_FALLBACK
             data = _post_chat(payload)
-            return data
+            return data, MODEL_FALLBACK
         # Fallback to local Ollama if gateway fails
         prompt = "\n".join([f"{m['role']}: {m['content']}" for m in messages])
         response = _post_ollama(prompt)
@@ -59,7 +154,7 @@ def chat(messages, model=None):
             'choices': [{
                 'message': {'content': response}
             }]
-        }
+        }, OLLAMA_MODEL
 
 
 def classify_contract_type(text):
@@ -4,6 +4,7 @@ import logging
 import requests
 from typing import Dict, Any, Optional
 from dotenv import load_dotenv
+from llm_gateway import make_session, response_json, cache_key, cache_get, cache_put
 
 load_dotenv()
 
@@ -13,6 +14,7 @@ class OllamaService:
         self.model = os.getenv('OLLAMA_MODEL', 'qwen2.5:7b')
         self.timeout = int(os.getenv('OLLAMA_TIMEOUT', '30'))
         self.enabled = os.getenv('OLLAMA_ENABLED', 'false').lower() == 'true'
+        self.session = make_session()
         
         if not self.enabled:
             logging.info("Ollama service disabled")
@@ -27,7 +29,7 @@ class OllamaService:
     
     def _check_connection(self):
         try:
-            response = requests.get(f"{self.host}/api/tags", timeout=5)
+            response = self.session.get(f"{self.host}/api/tags", timeout=5)
             if response.status_code != 200:
                 raise Exception(f"Ollama API returned {response.status_code}")
         except requests.exceptions.RequestException as e:
@@ -40,6 +42,10 @@ class OllamaService:
         try:
             # Формируем полный промпт с данными
             full_prompt = self._build_prompt(prompt, data)
+            key = cache_key(self.model, full_prompt)
+            cached = cache_get(key)
+            if cached is not None:
+                return cached
             
             payload = {
                 "model": self.model,
@@ -47,7 +53,7 @@ class OllamaService:
                 "stream": False
             }
             
-            response = requests.post(
+            response = self.session.post(
                 f"{self.host}/api/generate",
                 json=payload,
                 timeout=self.timeout
@@ -56,8 +62,10 @@ class OllamaService:
             if response.status_code != 200:
                 raise Exception(f"Ollama API error: {response.status_code}")
             
-            result = response.json()
-            return result.get('response', '').strip()
+            result = response_json(response)
+            text = result.get('response', '').strip()
+            cache_put(key, text)
+            return text
             
         except requests.exceptions.Timeout:
             raise Exception(f"Ollama request timeout after {self.timeout}s")
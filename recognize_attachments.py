@@ -4,7 +4,9 @@ import json
 import re
 import sqlite3
 import zipfile
+from itertools import repeat
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 # Optional imports
 try:
@@ -33,9 +35,11 @@ except Exception:
     BeautifulSoup = None
 
 try:
-    import lxml  # noqa: F401
+    from lxml import etree
+    from lxml import html as lxml_html
 except Exception:
-    pass
+    etree = None
+    lxml_html = None
 
 try:
     import docx
@@ -47,13 +51,36 @@ try:
 except Exception:
     openpyxl = None
 
+try:
+    import orjson
+except Exception:
+    orjson = None
+
 DB_PATH = os.getenv('FOOD_DB_PATH', 'food.db')
 ATTACHMENTS_ROOT = os.getenv('LOCAL_ATTACHMENTS_ROOT', 'attachments')
 PARSED_ROOT = os.getenv('PARSED_ROOT', 'parsed')
+PARSE_WORKERS = os.cpu_count() or 1
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_WS_RE = re.compile(r"\s+")
+_OBJECT_BLOCK_RE = re.compile(r"объекты закупки", re.IGNORECASE)
+_META_CHARSET_RE = re.compile(rb"<meta[^>]+charset", re.IGNORECASE)
 
+FOOD_KEYWORDS = [
+    "питание", "завтрак", "обед", "ужин", "дет", "школ",
+    "столов", "пищ", "рацион", "продукт"
+]
+_FOOD_KEYWORDS_RE = re.compile("|".join(map(re.escape, FOOD_KEYWORDS)), re.IGNORECASE)
 
-def init_db():
+
+def open_db():
     conn = sqlite3.connect(DB_PATH)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def init_db(conn):
     cur = conn.cursor()
     cur.execute('''
         CREATE TABLE IF NOT EXISTS parsed_documents (
@@ -77,44 +104,46 @@ def init_db():
         )
     ''')
     conn.commit()
-    conn.close()
 
 
-def save_parsed_meta(meta):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute('''
-        INSERT INTO parsed_documents (reestr_number, file_name, file_path, parsed_path, file_type, status, created_at)
-        VALUES (?, ?, ?, ?, ?, ?, datetime('now'))
-    ''', (
+def parsed_row(meta):
+    return (
         meta.get('reestr_number'),
         meta.get('file_name'),
         meta.get('file_path'),
         meta.get('parsed_path'),
         meta.get('file_type'),
         meta.get('status')
-    ))
-    conn.commit()
-    conn.close()
+    )
+
+
+def save_parsed_rows(conn, rows):
+    if not rows:
+        return
+    conn.executemany('''
+        INSERT INTO parsed_documents (reestr_number, file_name, file_path, parsed_path, file_type, status, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, datetime('now'))
+    ''', rows)
 
 
 def write_json(path, data):
     Path(path).parent.mkdir(parents=True, exist_ok=True)
+    if orjson:
+        Path(path).write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+        return
     with open(path, 'w', encoding='utf-8') as f:
         json.dump(data, f, ensure_ascii=False, indent=2)
 
 
 def extract_pdf_text(path):
-    text = ""
+    # PyMuPDF first: C-backed and much faster than pdfminer-based pdfplumber
+    if fitz:
+        with fitz.open(path) as doc:
+            return "\n".join(page.get_text("text") for page in doc).strip()
     if pdfplumber:
         with pdfplumber.open(path) as pdf:
-            for page in pdf.pages:
-                text += (page.extract_text() or "") + "\n"
-    elif fitz:
-        doc = fitz.open(path)
-        for page in doc:
-            text += page.get_text() + "\n"
-    return text.strip()
+            return "\n".join(page.extract_text() or "" for page in pdf.pages).strip()
+    return ""
 
 
 def extract_pdf_tables(path):
@@ -137,69 +166,152 @@ def extract_docx_text(path):
 def extract_xlsx(path):
     if not openpyxl:
         return {}
-    wb = openpyxl.load_workbook(path, data_only=True)
-    data = {}
-    for ws in wb.worksheets:
-        rows = []
-        for row in ws.iter_rows(values_only=True):
-            rows.append(["" if v is None else v for v in row])
-        data[ws.title] = rows
-    return data
+    # read_only streams rows from the zip instead of building every cell object
+    wb = openpyxl.load_workbook(path, data_only=True, read_only=True)
+    try:
+        data = {}
+        for ws in wb.worksheets:
+            data[ws.title] = [
+                ["" if v is None else v for v in row]
+                for row in ws.iter_rows(values_only=True)
+            ]
+        return data
+    finally:
+        wb.close()
+
+
+def _iter_visible_text(elem):
+    """
+    itertext() without script/style code and comments, as BeautifulSoup.get_text.
+    """
+    if not isinstance(elem.tag, str) or elem.tag in ('script', 'style'):
+        return
+    if elem.text:
+        yield elem.text
+    for child in elem:
+        yield from _iter_visible_text(child)
+        if child.tail:
+            yield child.tail
 
 
 def extract_html_text(path):
+    if lxml_html:
+        try:
+            # libxml2 reads the file itself; without a declared charset it would assume latin-1
+            with open(path, 'rb') as f:
+                declared = _META_CHARSET_RE.search(f.read(2048))
+            parser = None if declared else lxml_html.HTMLParser(encoding='utf-8')
+            root = lxml_html.parse(path, parser).getroot()
+            return "\n".join(_iter_visible_text(root)).strip() if root is not None else ""
+        except Exception:
+            pass
     raw = Path(path).read_text(encoding='utf-8', errors='ignore')
     if not BeautifulSoup:
         return raw
-    soup = BeautifulSoup(raw, 'html.parser')
+    soup = BeautifulSoup(raw, 'lxml' if etree else 'html.parser')
     return soup.get_text("\n").strip()
 
 
 def extract_xml_text(path):
+    if etree:
+        try:
+            return _iter_xml_text(path)
+        except Exception:
+            pass
     raw = Path(path).read_text(encoding='utf-8', errors='ignore')
     # Strip tags crudely for now
-    text = re.sub(r"<[^>]+>", " ", raw)
-    text = re.sub(r"\s+", " ", text)
-    return text.strip()
+    return _WS_RE.sub(" ", _TAG_RE.sub(" ", raw)).strip()
+
+
+def _iter_xml_text(path):
+    """
+    Streams element text with libxml2 in document order, freeing each
+    top-level element once its text is read.
+    """
+    parts = []
+    depth = 0
+    root = None
+    root_text_done = False
+    for event, elem in etree.iterparse(path, events=('start', 'end'), recover=True, huge_tree=True):
+        if event == 'start':
+            if depth == 0:
+                root = elem
+            depth += 1
+            continue
+        depth -= 1
+        if depth > 1:
+            continue
+        # Root text precedes its first child and is complete once that child ends
+        if not root_text_done:
+            if root.text:
+                parts.append(root.text)
+            root_text_done = True
+        # Read elements are deleted below, so siblings still in front are comments/PIs
+        for prev in root:
+            if prev is elem:
+                break
+            if prev.tail:
+                parts.append(prev.tail)
+        if depth == 1:
+            parts.extend(elem.itertext())
+            if elem.tail:
+                parts.append(elem.tail)
+            elem.clear()
+            while elem.getprevious() is not None:
+                del root[0]
+    return _WS_RE.sub(" ", " ".join(parts)).strip()
 
 
 def classify_from_web_text(text):
     if not text:
         return None, "web", "low"
-    lower = text.lower()
-    keywords = [
-        "питание", "завтрак", "обед", "ужин", "дет", "школ",
-        "столов", "пищ", "рацион", "продукт"
-    ]
-    if any(k in lower for k in keywords):
+    # One scan for all keywords, no lowercased copy
+    if _FOOD_KEYWORDS_RE.search(text):
         return "питание", "web", "high"
     return None, "web", "low"
 
 
 def extract_object_block(html_text):
-    idx = html_text.lower().find("объекты закупки")
-    if idx == -1:
+    m = _OBJECT_BLOCK_RE.search(html_text)
+    if not m:
         return ""
+    idx = m.start()
     return html_text[idx:idx + 2000]
 
 
-def save_contract_type(reestr_number, contract_type, source, confidence):
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute('''
-        INSERT INTO contract_types (reestr_number, contract_type, source, confidence, created_at)
-        VALUES (?, ?, ?, ?, datetime('now'))
-        ON CONFLICT(reestr_number) DO UPDATE SET
-            contract_type=excluded.contract_type,
-            source=excluded.source,
-            confidence=excluded.confidence,
-            created_at=excluded.created_at
-    ''', (reestr_number, contract_type, source, confidence))
-    conn.commit()
-    conn.close()
+def has_confident_contract_type(conn, reestr_number):
+    row = conn.execute(
+        "SELECT confidence FROM contract_types WHERE reestr_number = ?", (reestr_number,)
+    ).fetchone()
+    return bool(row) and row[0] != 'low'
+
+
+_UPSERT_CONTRACT_TYPE = '''
+    INSERT INTO contract_types (reestr_number, contract_type, source, confidence, created_at)
+    VALUES (?, ?, ?, ?, datetime('now'))
+    ON CONFLICT(reestr_number) DO UPDATE SET
+        contract_type=excluded.contract_type,
+        source=excluded.source,
+        confidence=excluded.confidence,
+        created_at=excluded.created_at
+'''
+
+
+def save_contract_type(conn, reestr_number, contract_type, source, confidence):
+    save_contract_types(conn, [(reestr_number, contract_type, source, confidence)])
+
+
+def save_contract_types(conn, rows):
+    """
+    Upserts (reestr_number, contract_type, source, confidence) rows; the caller commits.
+    """
+    conn.executemany(_UPSERT_CONTRACT_TYPE, rows)
 
 
 def handle_file(reestr_number, file_path):
+    """
+    Parses one attachment to JSON and returns its parsed_documents row.
+    """
     ext = file_path.suffix.lower()
     parsed = {
         'file': file_path.name,
@@ -230,7 +342,7 @@ def handle_file(reestr_number, file_path):
     parsed_path = parsed_dir / f"{file_path.name}.json"
     write_json(parsed_path, parsed)
 
-    save_parsed_meta({
+    return parsed_row({
         'reestr_number': reestr_number,
         'file_name': file_path.name,
         'file_path': str(file_path),
@@ -240,27 +352,47 @@ def handle_file(reestr_number, file_path):
     })
 
 
-def scan_contract(reestr_number):
+def extract_zip(zip_path):
+    """
+    Unpacks zip_path next to itself, unless an earlier run already did.
+    """
+    target = zip_path.parent / zip_path.stem
+    if target.is_dir() and any(target.iterdir()):
+        return
+    try:
+        with zipfile.ZipFile(zip_path, 'r') as z:
+            z.extractall(target)
+    except Exception:
+        pass
+
+
+def scan_contract(conn, reestr_number):
     root = Path(ATTACHMENTS_ROOT) / reestr_number
     if not root.exists():
         print(f"No attachments for {reestr_number}")
         return
 
-    # Unzip any zip files
-    for zip_path in root.glob('*.zip'):
-        try:
-            with zipfile.ZipFile(zip_path, 'r') as z:
-                z.extractall(root / zip_path.stem)
-        except Exception:
-            pass
-
-    for file_path in root.rglob('*'):
-        if file_path.is_file():
-            handle_file(reestr_number, file_path)
-
-    # Classify contract type from web page (document-info.html)
+    # Unzip any zip files; zlib releases the GIL, so archives inflate in parallel
+    zip_paths = list(root.glob('*.zip'))
+    if len(zip_paths) > 1:
+        with ThreadPoolExecutor(max_workers=min(PARSE_WORKERS, len(zip_paths))) as ex:
+            list(ex.map(extract_zip, zip_paths))
+    elif zip_paths:
+        extract_zip(zip_paths[0])
+
+    files = [p for p in root.rglob('*') if p.is_file()]
+    if len(files) > 1 and PARSE_WORKERS > 1:
+        # Parsing is CPU-bound and per-file independent; rows come back to this process
+        with ProcessPoolExecutor(max_workers=min(PARSE_WORKERS, len(files))) as ex:
+            pending_parsed = list(ex.map(handle_file, repeat(reestr_number), files))
+    else:
+        pending_parsed = [handle_file(reestr_number, p) for p in files]
+    save_parsed_rows(conn, pending_parsed)
+
+    # Classify contract type from web page (document-info.html),
+    # unless an earlier run already settled it
     web_html = root / 'document-info.html'
-    if web_html.exists():
+    if web_html.exists() and not has_confident_contract_type(conn, reestr_number):
         html_text = web_html.read_text(encoding='utf-8', errors='ignore')
         block = extract_object_block(html_text)
         ctype, source, confidence = classify_from_web_text(block)
@@ -274,7 +406,10 @@ def scan_contract(reestr_number):
                 ctype = "прочее"
                 source = "fallback"
                 confidence = "low"
-        save_contract_type(reestr_number, ctype, source, confidence)
+        save_contract_type(conn, reestr_number, ctype, source, confidence)
+
+    # Parsed rows and contract type land in one transaction
+    conn.commit()
 
 
 def main():
@@ -284,8 +419,10 @@ def main():
         return
 
     reestr_number = sys.argv[1]
-    init_db()
-    scan_contract(reestr_number)
+    conn = open_db()
+    init_db(conn)
+    scan_contract(conn, reestr_number)
+    conn.close()
     print("Done")
 
 
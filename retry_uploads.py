@@ -36,7 +36,18 @@ def get_drive_service():
     return build('drive', 'v3', credentials=get_creds())
 
 
+SIMPLE_UPLOAD_MAX = 5 * 1024 * 1024
+_folder_cache = {}
+
+
 def ensure_folder(service, name, parent_id):
+    key = (name, parent_id)
+    if key not in _folder_cache:
+        _folder_cache[key] = _find_or_create_folder(service, name, parent_id)
+    return _folder_cache[key]
+
+
+def _find_or_create_folder(service, name, parent_id):
     q = f"name = '{name}' and mimeType = 'application/vnd.google-apps.folder' and trashed = false"
     if parent_id:
         q += f" and '{parent_id}' in parents"
@@ -55,7 +66,8 @@ def ensure_folder(service, name, parent_id):
 
 
 def upload_file(service, path, name, parent_id):
-    media = MediaFileUpload(path, resumable=True)
+    # Simple upload for small files saves the resumable session round trip
+    media = MediaFileUpload(path, resumable=os.path.getsize(path) > SIMPLE_UPLOAD_MAX)
     meta = {'name': name, 'parents': [parent_id]}
     file = service.files().create(body=meta, media_body=media, fields='id').execute()
     return file['id']
@@ -70,24 +82,29 @@ def main():
     cur.execute("SELECT id, reestr_number, file_name, local_path FROM attachments WHERE status LIKE 'pending_upload%'")
     rows = cur.fetchall()
 
+    # Folder lookups once per contract, not per row
+    rows_by_contract = {}
     for row in rows:
-        row_id, reestr_number, file_name, local_path = row
-        if not local_path or not os.path.exists(local_path):
-            continue
+        local_path = row[3]
+        if local_path and os.path.exists(local_path):
+            rows_by_contract.setdefault(row[1], []).append(row)
+
+    for reestr_number, contract_rows in rows_by_contract.items():
         contract_folder = ensure_folder(service, reestr_number, base_folder)
         files_folder = ensure_folder(service, 'files', contract_folder)
         source_folder = ensure_folder(service, 'source', contract_folder)
-        parent = source_folder if file_name == 'document-info.html' else files_folder
-
-        try:
-            drive_id = upload_file(service, local_path, file_name, parent)
-            cur.execute("UPDATE attachments SET drive_file_id = ?, status = 'uploaded' WHERE id = ?", (drive_id, row_id))
-            conn.commit()
-            print(f"Uploaded: {file_name}")
-        except Exception as e:
-            cur.execute("UPDATE attachments SET retry_count = retry_count + 1 WHERE id = ?", (row_id,))
-            conn.commit()
-            print(f"Failed: {file_name} -> {e}")
+        for row_id, _, file_name, local_path in contract_rows:
+            parent = source_folder if file_name == 'document-info.html' else files_folder
+
+            try:
+                drive_id = upload_file(service, local_path, file_name, parent)
+                cur.execute("UPDATE attachments SET drive_file_id = ?, status = 'uploaded' WHERE id = ?", (drive_id, row_id))
+                conn.commit()
+                print(f"Uploaded: {file_name}")
+            except Exception as e:
+                cur.execute("UPDATE attachments SET retry_count = retry_count + 1 WHERE id = ?", (row_id,))
+                conn.commit()
+                print(f"Failed: {file_name} -> {e}")
 
     conn.close()
 
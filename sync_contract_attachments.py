@@ -3,17 +3,19 @@ import os
 import re
 import json
 import sqlite3
-import time
+import threading
 import tarfile
-import tempfile
 import subprocess
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 from google.oauth2.service_account import Credentials
 from google.oauth2.credentials import Credentials as UserCredentials
 from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaFileUpload
+from concurrent.futures import ThreadPoolExecutor
 
 SCOPES = [
     'https://www.googleapis.com/auth/spreadsheets',
@@ -29,6 +31,35 @@ DB_PATH = os.getenv('FOOD_DB_PATH', 'food.db')
 TARGET_FOLDER_ID = os.getenv('TARGET_FOLDER_ID', '1dt-L4A68Wu4KVuydb-zZi8b88sc1L5PH')
 LOCAL_ATTACHMENTS_ROOT = os.getenv('LOCAL_ATTACHMENTS_ROOT', 'attachments')
 
+_CID_RE = re.compile(r"contractInfoId=(\d+)")
+DOWNLOAD_CHUNK = 1 << 20
+SSH_HOST = 'ussr'
+# One multiplexed connection serves every ssh call of a run
+SSH_OPTS = [
+    '-o', 'ControlMaster=auto',
+    '-o', 'ControlPath=~/.ssh/cm-%r@%h:%p',
+    '-o', 'ControlPersist=60s',
+]
+TRANSFER_WORKERS = 8
+
+
+def make_session():
+    """
+    Keep-alive session for zakupki.gov.ru pages and attachment downloads.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=10,
+        max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+_SESSION = make_session()
+
 
 def get_creds():
     if OAUTH_TOKEN_PATH and os.path.exists(OAUTH_TOKEN_PATH):
@@ -45,7 +76,32 @@ def get_drive_service():
     return build('drive', 'v3', credentials=get_creds())
 
 
+_tls = threading.local()
+
+
+def thread_drive_service():
+    """
+    Drive service for the current thread; googleapiclient services are not thread-safe.
+    """
+    service = getattr(_tls, 'service', None)
+    if service is None:
+        service = get_drive_service()
+        _tls.service = service
+    return service
+
+
+SIMPLE_UPLOAD_MAX = 5 * 1024 * 1024
+_folder_cache = {}
+
+
 def ensure_folder(service, name, parent_id):
+    key = (name, parent_id)
+    if key not in _folder_cache:
+        _folder_cache[key] = _find_or_create_folder(service, name, parent_id)
+    return _folder_cache[key]
+
+
+def _find_or_create_folder(service, name, parent_id):
     q = f"name = '{name}' and mimeType = 'application/vnd.google-apps.folder' and trashed = false"
     if parent_id:
         q += f" and '{parent_id}' in parents"
@@ -64,50 +120,52 @@ def ensure_folder(service, name, parent_id):
 
 
 def upload_file(service, path, name, parent_id):
-    media = MediaFileUpload(path, resumable=True)
+    # Simple upload for small files saves the resumable session round trip
+    media = MediaFileUpload(path, resumable=os.path.getsize(path) > SIMPLE_UPLOAD_MAX)
     meta = {'name': name, 'parents': [parent_id]}
     file = service.files().create(body=meta, media_body=media, fields='id').execute()
     return file['id']
 
 
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute('''
-        CREATE TABLE IF NOT EXISTS attachments (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            reestr_number TEXT,
-            file_name TEXT,
-            url TEXT,
-            drive_file_id TEXT,
-            size INTEGER,
-            content_type TEXT,
-            status TEXT,
-            local_path TEXT,
-            retry_count INTEGER DEFAULT 0,
-            created_at TEXT
-        )
-    ''')
-    # Backward compatibility for older schema
-    for col, col_def in [
-        ('local_path', 'TEXT'),
-        ('retry_count', 'INTEGER DEFAULT 0')
-    ]:
-        try:
-            cur.execute(f"ALTER TABLE attachments ADD COLUMN {col} {col_def}")
-        except sqlite3.OperationalError:
-            pass
-    conn.commit()
-    conn.close()
-
-
-def save_attachment_meta(meta):
+def open_db():
     conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    cur.execute('''
-        INSERT INTO attachments (reestr_number, file_name, url, drive_file_id, size, content_type, status, local_path, retry_count, created_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))
-    ''', (
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def init_db(conn):
+    # DDL does not open a transaction implicitly, so begin one for the whole schema check
+    with conn:
+        conn.execute("BEGIN")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS attachments (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                reestr_number TEXT,
+                file_name TEXT,
+                url TEXT,
+                drive_file_id TEXT,
+                size INTEGER,
+                content_type TEXT,
+                status TEXT,
+                local_path TEXT,
+                retry_count INTEGER DEFAULT 0,
+                created_at TEXT
+            )
+        ''')
+        # Backward compatibility for older schema
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(attachments)")}
+        for col, col_def in [
+            ('local_path', 'TEXT'),
+            ('retry_count', 'INTEGER DEFAULT 0')
+        ]:
+            if col not in existing:
+                conn.execute(f"ALTER TABLE attachments ADD COLUMN {col} {col_def}")
+
+
+def attachment_row(meta):
+    return (
         meta.get('reestr_number'),
         meta.get('file_name'),
         meta.get('url'),
@@ -117,15 +175,26 @@ def save_attachment_meta(meta):
         meta.get('status'),
         meta.get('local_path'),
         meta.get('retry_count', 0)
-    ))
-    conn.commit()
-    conn.close()
+    )
+
+
+def save_attachments(conn, rows):
+    """
+    Inserts all attachment rows in one transaction.
+    """
+    if not rows:
+        return
+    with conn:
+        conn.executemany('''
+            INSERT INTO attachments (reestr_number, file_name, url, drive_file_id, size, content_type, status, local_path, retry_count, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))
+        ''', rows)
 
 
 def fetch_contract_info_id(reestr_number):
     url = f"https://zakupki.gov.ru/epz/contract/contractCard/common-info.html?reestrNumber={reestr_number}"
-    resp = requests.get(url, timeout=30)
-    m = re.search(r"contractInfoId=(\d+)", resp.text)
+    resp = _SESSION.get(url, timeout=30)
+    m = _CID_RE.search(resp.text)
     return m.group(1) if m else None
 
 
@@ -135,51 +204,120 @@ def save_html_copy(reestr_number, dest_path):
         url = f"https://zakupki.gov.ru/epz/contract/contractCard/document-info.html?reestrNumber={reestr_number}&contractInfoId={cid}"
     else:
         url = f"https://zakupki.gov.ru/epz/contract/contractCard/document-info.html?reestrNumber={reestr_number}"
-    resp = requests.get(url, timeout=30)
+    resp = _SESSION.get(url, timeout=30)
     with open(dest_path, 'w', encoding='utf-8') as f:
         f.write(resp.text)
     return url
 
 
 def fetch_attachments_via_ssh(reestr_number):
-    cmd = (
-        "ssh ussr "
-        f"\"~/zakupki-parser/venv/bin/python ~/zakupki-parser/fetch_contract_attachments.py "
-        f"{reestr_number} 'https://zakupki.gov.ru/epz/contract/contractCard/common-info.html?reestrNumber={reestr_number}'\""
+    remote_cmd = (
+        "~/zakupki-parser/venv/bin/python ~/zakupki-parser/fetch_contract_attachments.py "
+        f"{reestr_number} 'https://zakupki.gov.ru/epz/contract/contractCard/common-info.html?reestrNumber={reestr_number}'"
     )
-    output = os.popen(cmd).read().strip()
-    return json.loads(output)
+    proc = subprocess.run(
+        ['ssh', *SSH_OPTS, SSH_HOST, remote_cmd],
+        capture_output=True, text=True, timeout=600
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"SSH fetch failed: {proc.stderr}")
+    return json.loads(proc.stdout.strip())
 
 
 def pull_attachments_archive(reestr_number, local_dir):
     os.makedirs(local_dir, exist_ok=True)
-    with tempfile.NamedTemporaryFile(suffix='.tar.gz', delete=False) as tmp:
-        archive_path = tmp.name
     cmd = [
-        'ssh', 'ussr',
+        'ssh', *SSH_OPTS, SSH_HOST,
         f"tar -czf - ~/zakupki-parser/attachments/{reestr_number}"
     ]
-    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    with open(archive_path, 'wb') as f:
-        for chunk in iter(lambda: proc.stdout.read(1024 * 1024), b''):
-            f.write(chunk)
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=1024 * 1024)
+    # Extract while the archive is still arriving; 'r|gz' reads the pipe sequentially
+    try:
+        with tarfile.open(fileobj=proc.stdout, mode='r|gz') as tar:
+            tar.extractall(path=local_dir)
+    except tarfile.TarError:
+        proc.wait(timeout=120)
+        if proc.returncode == 0:
+            raise
     proc.wait(timeout=120)
     if proc.returncode != 0:
         err = proc.stderr.read().decode('utf-8')
         raise RuntimeError(f"SSH tar failed: {err}")
 
-    with tarfile.open(archive_path, 'r:gz') as tar:
-        tar.extractall(path=local_dir)
-    os.remove(archive_path)
-
 
 def download_file(url, path):
-    resp = requests.get(url, timeout=60)
-    if resp.status_code != 200:
-        return None, resp.status_code, None
-    with open(path, 'wb') as f:
-        f.write(resp.content)
-    return resp.headers, resp.status_code, len(resp.content)
+    with _SESSION.get(url, timeout=60, stream=True) as resp:
+        if resp.status_code != 200:
+            return None, resp.status_code, None
+        size = 0
+        # Stream to a side file so an interrupted download never looks complete
+        part_path = path + '.part'
+        try:
+            with open(part_path, 'wb') as f:
+                for chunk in resp.iter_content(DOWNLOAD_CHUNK):
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(part_path, path)
+        except Exception:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+            raise
+        return resp.headers, resp.status_code, size
+
+
+def process_attachment(item, idx, reestr_number, local_contract_dir, files_folder):
+    """
+    Downloads one attachment (unless the archive already brought it),
+    uploads it to Drive when a folder is given and returns its attachments row.
+    Never raises: a failed download becomes a download_failed_* row.
+    """
+    url = item.get('url')
+    # Indexed fallback so nameless items do not share one local path
+    file_name = item.get('file_name') or f'file_{idx}.bin'
+    local_path = os.path.join(local_contract_dir, file_name)
+    try:
+        # If file already exists from archive, skip download
+        if not os.path.exists(local_path):
+            headers, status_code, size = download_file(url, local_path)
+        else:
+            headers, status_code, size = None, 200, os.path.getsize(local_path)
+    except Exception as e:
+        print(f"WARN: download failed for {url}: {e}")
+        headers, status_code, size = None, type(e).__name__, None
+
+    if status_code != 200:
+        return attachment_row({
+            'reestr_number': reestr_number,
+            'file_name': file_name,
+            'url': url,
+            'drive_file_id': None,
+            'size': size,
+            'content_type': None,
+            'status': f"download_failed_{status_code}",
+            'local_path': local_path
+        })
+
+    if files_folder:
+        try:
+            drive_id = upload_file(thread_drive_service(), local_path, file_name, files_folder)
+            status = 'uploaded'
+        except Exception as e:
+            drive_id = None
+            status = f"pending_upload: {e}"
+    else:
+        drive_id = None
+        status = 'pending_upload'
+
+    return attachment_row({
+        'reestr_number': reestr_number,
+        'file_name': file_name,
+        'url': url,
+        'drive_file_id': drive_id,
+        'size': size,
+        'content_type': headers.get('Content-Type') if headers else None,
+        'status': status,
+        'local_path': local_path
+    })
 
 
 def main():
@@ -189,7 +327,9 @@ def main():
         return
 
     reestr_number = sys.argv[1]
-    init_db()
+    conn = open_db()
+    init_db(conn)
+    pending_attachments = []
 
     # Prepare local storage
     local_contract_dir = os.path.join(LOCAL_ATTACHMENTS_ROOT, reestr_number)
@@ -234,7 +374,7 @@ def main():
     else:
         status = 'pending_upload'
 
-    save_attachment_meta({
+    pending_attachments.append(attachment_row({
         'reestr_number': reestr_number,
         'file_name': 'document-info.html',
         'url': html_url,
@@ -243,70 +383,35 @@ def main():
         'content_type': 'text/html',
         'status': status,
         'local_path': html_path
-    })
+    }))
 
-    # Process files from payload
-    for item in payload.get('files', []):
-        url = item.get('url')
-        file_name = item.get('file_name') or 'file.bin'
-        local_path = os.path.join(local_contract_dir, file_name)
-        # If file already exists from archive, skip download
-        if not os.path.exists(local_path):
-            headers, status_code, size = download_file(url, local_path)
-        else:
-            headers, status_code, size = None, 200, os.path.getsize(local_path)
+    # Downloads and uploads are I/O-bound; rows are written together below
+    items = payload.get('files', [])
+    if items:
+        with ThreadPoolExecutor(max_workers=min(TRANSFER_WORKERS, len(items))) as ex:
+            pending_attachments.extend(ex.map(
+                lambda item, idx: process_attachment(item, idx, reestr_number, local_contract_dir, files_folder),
+                items, range(len(items))
+            ))
 
-        if status_code != 200:
-            save_attachment_meta({
-                'reestr_number': reestr_number,
-                'file_name': file_name,
-                'url': url,
-                'drive_file_id': None,
-                'size': size,
-                'content_type': None,
-                'status': f"download_failed_{status_code}",
-                'local_path': local_path
-            })
-            continue
-
-        if service and files_folder:
-            try:
-                drive_id = upload_file(service, local_path, file_name, files_folder)
-                status = 'uploaded'
-            except Exception as e:
-                drive_id = None
-                status = f"pending_upload: {e}"
-        else:
-            drive_id = None
-            status = 'pending_upload'
-
-        save_attachment_meta({
-            'reestr_number': reestr_number,
-            'file_name': file_name,
-            'url': url,
-            'drive_file_id': drive_id,
-            'size': size,
-            'content_type': headers.get('Content-Type') if headers else None,
-            'status': status,
-            'local_path': local_path
-        })
-        time.sleep(0.2)
+    # All attachment rows in one transaction
+    save_attachments(conn, pending_attachments)
 
-    # Auto run recognition on local files
+    # Auto run recognition on local files, in this process and on the same connection
     try:
-        import subprocess
-        subprocess.run([
-            os.path.join(os.path.dirname(__file__), 'venv', 'bin', 'python'),
-            os.path.join(os.path.dirname(__file__), 'recognize_attachments.py'),
-            reestr_number
-        ], check=False)
-        subprocess.run([
-            os.path.join(os.path.dirname(__file__), 'venv', 'bin', 'python'),
-            os.path.join(os.path.dirname(__file__), 'compare_parsed.py'),
-            reestr_number
-        ], check=False)
+        import recognize_attachments
+        recognize_attachments.init_db(conn)
+        recognize_attachments.scan_contract(conn, reestr_number)
     except Exception as e:
         print(f"WARN: recognition failed: {e}")
+    conn.close()
+
+    try:
+        import compare_parsed
+        compare_parsed.init_db()
+        compare_parsed.compare(reestr_number)
+    except Exception as e:
+        print(f"WARN: compare failed: {e}")
 
     print("Done")
 
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Unit tests for extract_html_text: the lxml path must match the BeautifulSoup fallback
+"""
+
+import sys
+import pytest
+
+import recognize_attachments
+
+TEST_CASES = [
+    # (html, expected, description)
+    ('<html><head><title>T</title><script>var x = "SCRIPTTEXT";</script>'
+     '<style>.a{color:red}</style></head><body><h1>Объекты закупки</h1>'
+     '<!-- c --><p>Привет</p></body></html>',
+     'T\nОбъекты закупки\nПривет', 'Script, style and comment skipped'),
+    ('<html><body><div>a<script>s</script>tail<b>b</b></div></body></html>',
+     'a\ntail\nb', 'Tail after script kept'),
+]
+
+
+@pytest.mark.parametrize(
+    "html,expected",
+    [case[:2] for case in TEST_CASES],
+    ids=[case[2] for case in TEST_CASES],
+)
+def test_lxml_matches_soup_fallback(html, expected, tmp_path, monkeypatch):
+    if recognize_attachments.lxml_html is None or recognize_attachments.BeautifulSoup is None:
+        pytest.skip("lxml or bs4 is not installed")
+    path = tmp_path / "document-info.html"
+    path.write_text(html, encoding='utf-8')
+
+    assert recognize_attachments.extract_html_text(str(path)) == expected
+    monkeypatch.setattr(recognize_attachments, "lxml_html", None)
+    assert recognize_attachments.extract_html_text(str(path)) == expected
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
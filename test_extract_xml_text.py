@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Unit tests for extract_xml_text: the lxml path must match the regex fallback
+"""
+
+import sys
+import pytest
+
+import recognize_attachments
+
+TEST_CASES = [
+    # (xml, description)
+    ('<root>head<a>A</a>tailA<b>B<c>C</c>tailC</b>tailB</root>', 'Nested text and tails'),
+    ('<root>only</root>', 'Root text only'),
+    ('<root/>', 'Empty root'),
+    ('<root>head<!-- c --><a>A</a>end</root>', 'Comment before first child'),
+    ('<root>x<!-- c -->y<?pi z?>w</root>', 'Comment and PI tails without child elements'),
+    ('<?xml version="1.0" encoding="utf-8"?>\n<r>\n <x a="1">Привет</x>\n <y>мир<z/>!</y> конец\n</r>\n',
+     'Declaration, attributes and Cyrillic'),
+]
+
+
+@pytest.mark.parametrize(
+    "xml",
+    [case[0] for case in TEST_CASES],
+    ids=[case[1] for case in TEST_CASES],
+)
+def test_lxml_matches_regex_fallback(xml, tmp_path, monkeypatch):
+    if recognize_attachments.etree is None:
+        pytest.skip("lxml is not installed")
+    path = tmp_path / "doc.xml"
+    path.write_text(xml, encoding='utf-8')
+
+    streamed = recognize_attachments.extract_xml_text(str(path))
+    monkeypatch.setattr(recognize_attachments, "etree", None)
+    assert streamed == recognize_attachments.extract_xml_text(str(path))
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
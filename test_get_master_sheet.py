@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Unit tests for get_master_sheet
+"""
+
+import sys
+import pytest
+
+import bot
+
+
+class FakeClient:
+    def __init__(self):
+        self.opened = []
+
+    def open_by_key(self, key):
+        self.opened.append(key)
+        return f"sheet:{key}"
+
+
+def test_get_master_sheet_opens_once(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(bot, "get_gc", lambda: client)
+    monkeypatch.setattr(bot, "_master_sh", None)
+
+    assert bot.get_master_sheet() == f"sheet:{bot.MASTER_SHEET_ID}"
+    assert bot.get_master_sheet() == f"sheet:{bot.MASTER_SHEET_ID}"
+    # Handle is cached after the first open
+    assert client.opened == [bot.MASTER_SHEET_ID]
+
+
+def test_get_master_sheet_without_credentials(monkeypatch):
+    monkeypatch.setattr(bot, "get_gc", lambda: None)
+    monkeypatch.setattr(bot, "_master_sh", None)
+
+    assert bot.get_master_sheet() is None
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the llm_gateway response cache
+"""
+
+import sys
+import json
+import pytest
+
+import llm_gateway
+
+MESSAGES = [{'role': 'user', 'content': 'Услуги питания'}]
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_gateway, "LLM_CACHE_PATH", str(tmp_path / "llm_cache.db"))
+    monkeypatch.setattr(llm_gateway, "_cache_conn", None)
+    yield
+    if llm_gateway._cache_conn is not None:
+        llm_gateway._cache_conn.close()
+
+
+def primary_key():
+    return llm_gateway.cache_key(
+        llm_gateway.MODEL_PRIMARY, json.dumps(MESSAGES, ensure_ascii=False, sort_keys=True)
+    )
+
+
+def reply(content):
+    return {'choices': [{'message': {'content': content}}]}
+
+
+def test_primary_answer_is_cached(cache, monkeypatch):
+    monkeypatch.setattr(llm_gateway, "_post_chat", lambda payload: reply(payload['model']))
+
+    assert llm_gateway.chat(MESSAGES) == reply(llm_gateway.MODEL_PRIMARY)
+    assert llm_gateway.cache_get(primary_key()) == reply(llm_gateway.MODEL_PRIMARY)
+
+
+def test_fallback_answer_is_not_cached(cache, monkeypatch):
+    def post_chat(payload):
+        if payload['model'] == llm_gateway.MODEL_PRIMARY:
+            raise RuntimeError("LLM error 503")
+        return reply(payload['model'])
+
+    monkeypatch.setattr(llm_gateway, "_post_chat", post_chat)
+
+    assert llm_gateway.chat(MESSAGES) == reply(llm_gateway.MODEL_FALLBACK)
+    assert llm_gateway.cache_get(primary_key()) is None
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-q"]))
@@ -4,7 +4,11 @@ import asyncio
 import json
 import re
 import hashlib
-from playwright.async_api import async_playwright
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 REQUIISITE_KEYWORDS = [
     "лицевой счет",
@@ -26,27 +30,58 @@ PRICE_SELECTORS = [
     ".contract-card__price",
 ]
 
+_RE_CAT_14 = re.compile(r"1[- ]4|начальн")
+_RE_CAT_OVZ = re.compile(r"овз|ограничен")
+_RE_CAT_SR = re.compile(r"5[- ]9|5[- ]11|старш")
+_RE_CAT_GPD = re.compile(r"гпд|продлен")
+# First match wins. The order is the historical one (1-4 before ОВЗ), since
+# categories end up in objects_hash
+_CATEGORY_RULES = (
+    (_RE_CAT_14.search, "1-4 классы"),
+    (_RE_CAT_OVZ.search, "ОВЗ"),
+    (_RE_CAT_SR.search, "5-11 классы"),
+    (_RE_CAT_GPD.search, "ГПД"),
+    (re.compile("завтрак").search, "Завтрак"),
+    (re.compile("обед").search, "Обед"),
+)
+_RE_NUM = re.compile(r"(\d+\.?\d*)")
+# clean_number single-char passes: before and after the VAT phrases are cut out
+_PRE_CLEAN_TRANS = str.maketrans({"\xa0": " ", "₽": None})
+_CLEAN_TRANS = str.maketrans({" ": None, "\t": None, ",": "."})
+_RE_REQ_DIGITS = re.compile(r"\b\d{9}\b|\b\d{20}\b")
+_RE_REQUISITES = re.compile(
+    r"(?=(?i:БИК)\s*[:\s]*(?P<bik>[0-9]{9}))"
+    r"|(?=(?i:К/С|Корр\.\s*счет|Корр\.\s*сч[её]т)\s*[:\s]*(?P<corr_account>[0-9]{20}))"
+    r"|(?=(?i:Р/С|Расчетный\s*счет|Расч[её]тный\s*счет)\s*[:\s]*(?P<account>[0-9]{20}))"
+    r"|(?=(?i:Лицев[оы]й\s*сч[её]т)[^0-9]*(?P<treasury_account>[0-9]{20}))"
+    r"|(?=(?i:\bИНН\b)\s*[:\s]*(?P<inn>[0-9]{10,12}))"
+    r"|(?=(?i:\bКПП\b)\s*[:\s]*(?P<kpp>[0-9]{9}))"
+    r"|(?=(?P<bank_name>(?:ПАО|АО|ООО|ФК|УФК)[^\n]{3,120}))"
+)
+_REQUISITE_KEYS = ("bik", "corr_account", "account", "treasury_account", "inn", "kpp", "bank_name")
+_RE_REESTR = re.compile(r"reestrNumber=(\d+)")
+# Elements that mean a tab has rendered (or has nothing to show)
+OBJECTS_READY_SELECTOR = ".tableBlock tbody tr, .noDataMsg"
+EXECUTION_READY_SELECTOR = ":text('Фактически оплачено'), :text('Стоимость исполненных обязательств'), .noDataMsg"
+TAB_READY_TIMEOUT = 8000
+BROWSER_ARGS = ["--disable-gpu", "--disable-dev-shm-usage"]
+# Stylesheets stay: innerText depends on CSS, and object texts feed objects_hash
+BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
+PRICE_TEXTS_JS = "sels => sels.map(s => { const el = document.querySelector(s); return el ? el.innerText : null; })"
+ROW_CELLS_JS = "rows => rows.map(tr => Array.from(tr.querySelectorAll('td'), td => td.innerText))"
+CONTRACT_CARD_URL = "https://zakupki.gov.ru/epz/contract/contractCard/{tab}.html?reestrNumber={reestr}"
+# All requisite keywords in one pass
+_RE_REQUISITE_KW = re.compile("|".join(map(re.escape, REQUIISITE_KEYWORDS)), re.IGNORECASE)
+
 
 def detect_category(name):
     """
     Определяет категорию питания по названию услуги.
     """
     name_lower = name.lower()
-
-    if re.search(r"1[- ]4|начальн", name_lower):
-        return "1-4 классы"
-    if re.search(r"овз|ограничен", name_lower):
-        # ОВЗ приоритетнее, так как бывает "ОВЗ 1-4"
-        return "ОВЗ"
-    if re.search(r"5[- ]9|5[- ]11|старш", name_lower):
-        return "5-11 классы"
-    if re.search(r"гпд|продлен", name_lower):
-        return "ГПД"
-    if "завтрак" in name_lower:
-        return "Завтрак"
-    if "обед" in name_lower:
-        return "Обед"
-
+    for matches, label in _CATEGORY_RULES:
+        if matches(name_lower):
+            return label
     return "Прочее"
 
 
@@ -59,14 +94,11 @@ def clean_number(value_str):
         return 0.0
 
     # Берем первую строку, где чаще всего находится значение
-    line = value_str.split("\n")[0]
-    line = line.replace("\xa0", " ")
-    line = line.replace("₽", "").replace("RUB", "")
+    line = value_str.split("\n", 1)[0].translate(_PRE_CLEAN_TRANS).replace("RUB", "")
     line = line.replace("Ставка НДС: 20%", "").replace("Ставка НДС: Без НДС", "")
-    line = line.replace(" ", "").replace("\t", "")
-    line = line.replace(",", ".")
+    line = line.translate(_CLEAN_TRANS)
 
-    match = re.search(r"(\d+\.?\d*)", line)
+    match = _RE_NUM.search(line)
     if not match:
         return 0.0
 
@@ -81,13 +113,13 @@ def is_requisite_row(name, price_text, total_text):
         name or "",
         price_text or "",
         total_text or "",
-    ]).lower()
+    ])
 
-    if any(keyword in text for keyword in REQUIISITE_KEYWORDS):
+    if _RE_REQUISITE_KW.search(text):
         return True
 
     # Частый случай: реквизиты в строках с нулевой суммой
-    if clean_number(total_text) == 0 and re.search(r"\b\d{9}\b|\b\d{20}\b", text):
+    if clean_number(total_text) == 0 and _RE_REQ_DIGITS.search(text):
         return True
 
     return False
@@ -97,8 +129,8 @@ def extract_requisites(raw_blocks):
     """
     Извлекает реквизиты из сырых строк/блоков.
     """
-    raw_text = "\n".join([block for block in raw_blocks if block])
-    raw_text = raw_text.replace("\xa0", " ")
+    # str.replace of a single char is cheaper than translate for a non-ASCII source
+    raw_text = "\n".join(filter(None, raw_blocks)).replace("\xa0", " ")
 
     requisites = {
         "bank_name": "",
@@ -114,67 +146,204 @@ def extract_requisites(raw_blocks):
     if not raw_text:
         return requisites
 
-    bik_match = re.search(r"БИК\s*[:\s]*([0-9]{9})", raw_text, re.IGNORECASE)
-    if bik_match:
-        requisites["bik"] = bik_match.group(1)
-
-    corr_match = re.search(r"(К/С|Корр\.\s*счет|Корр\.\s*сч[её]т)\s*[:\s]*([0-9]{20})", raw_text, re.IGNORECASE)
-    if corr_match:
-        requisites["corr_account"] = corr_match.group(2)
+    # One pass over the text. Each alternative is a lookahead so matches may
+    # overlap (the bank line often contains the BIK), as with separate searches.
+    for m in _RE_REQUISITES.finditer(raw_text):
+        key = m.lastgroup
+        if not requisites[key]:
+            requisites[key] = m.group(key).strip()
+            if all(requisites[k] for k in _REQUISITE_KEYS):
+                break
 
-    acc_match = re.search(r"(Р/С|Расчетный\s*счет|Расч[её]тный\s*счет)\s*[:\s]*([0-9]{20})", raw_text, re.IGNORECASE)
-    if acc_match:
-        requisites["account"] = acc_match.group(2)
-
-    treasury_match = re.search(r"Лицев[оы]й\s*сч[её]т[^0-9]*([0-9]{20})", raw_text, re.IGNORECASE)
-    if treasury_match:
-        requisites["treasury_account"] = treasury_match.group(1)
+    return requisites
 
-    inn_match = re.search(r"\bИНН\b\s*[:\s]*([0-9]{10,12})", raw_text, re.IGNORECASE)
-    if inn_match:
-        requisites["inn"] = inn_match.group(1)
 
-    kpp_match = re.search(r"\bКПП\b\s*[:\s]*([0-9]{9})", raw_text, re.IGNORECASE)
-    if kpp_match:
-        requisites["kpp"] = kpp_match.group(1)
+# Hashes are stored and compared across runs, so the canonical JSON form must not change
+_HASH_ENCODER = json.JSONEncoder(ensure_ascii=False, sort_keys=True)
 
-    # Банк (если удалось вытащить строкой)
-    bank_match = re.search(r"(ПАО|АО|ООО|ФК|УФК)[^\n]{3,120}", raw_text)
-    if bank_match:
-        requisites["bank_name"] = bank_match.group(0).strip()
 
-    return requisites
+def stable_hash(value):
+    return hashlib.sha256(_HASH_ENCODER.encode(value).encode("utf-8")).hexdigest()
 
 
-def stable_hash(value):
-    dump = json.dumps(value, ensure_ascii=False, sort_keys=True)
-    return hashlib.sha256(dump.encode("utf-8")).hexdigest()
+def emit(value):
+    """
+    Writes value as one JSON line on stdout (UTF-8, non-ASCII kept as is).
+    """
+    if orjson:
+        sys.stdout.buffer.write(orjson.dumps(value) + b"\n")
+        sys.stdout.buffer.flush()
+    else:
+        print(json.dumps(value, ensure_ascii=False), flush=True)
 
 
 async def extract_price_from_page(page):
-    for selector in PRICE_SELECTORS:
-        try:
-            price_el = page.locator(selector).first
-            if await price_el.count() > 0:
-                text = await price_el.inner_text()
-                if clean_number(text) > 0:
-                    return text
-        except Exception:
-            continue
+    # One evaluate for all selectors; PRICE_SELECTORS order still decides the winner
+    try:
+        texts = await page.evaluate(PRICE_TEXTS_JS, PRICE_SELECTORS)
+    except Exception:
+        return ""
+    for text in texts:
+        if text and clean_number(text) > 0:
+            return text
     return ""
 
 
-async def main():
-    if len(sys.argv) < 2:
-        print(json.dumps({"error": "No URL provided"}))
-        sys.exit(1)
+async def open_tab(page, selector, text, url=None):
+    """
+    Opens a contract card tab: directly when its URL is known,
+    otherwise through the tab link on the current page.
+    """
+    if url:
+        await page.goto(url, wait_until="domcontentloaded")
+        return True
+
+    tab = page.locator(selector).first
+    if await tab.count() == 0:
+        tab = page.get_by_text(text).first
+    if await tab.count() == 0:
+        return False
+
+    href = await tab.get_attribute("href")
+    if href:
+        if not href.startswith("http"):
+            href = "https://zakupki.gov.ru" + href
+        await page.goto(href, wait_until="domcontentloaded")
+    else:
+        await tab.click()
+        await page.wait_for_load_state("domcontentloaded")
+    return True
+
+
+async def wait_for_ready(page, selector):
+    """
+    Waits until the tab content the scraper reads is attached, instead of a fixed sleep.
+    """
+    try:
+        await page.locator(selector).first.wait_for(state="attached", timeout=TAB_READY_TIMEOUT)
+    except Exception:
+        pass
+
+
+async def fetch_common_info(page, url, results):
+    await page.goto(url, timeout=60000, wait_until="domcontentloaded")
+
+    try:
+        match = _RE_REESTR.search(page.url)
+        if match:
+            results['reestr_number'] = match.group(1)
+    except:
+        pass
+
+    try:
+        customer_el = page.locator("a[href*='organization']").first
+        if await customer_el.count() > 0:
+            results['customer'] = await customer_el.inner_text()
+        else:
+            lbl = page.get_by_text("Заказчик", exact=False).first
+            if await lbl.count() > 0:
+                results['customer'] = await lbl.locator("..").inner_text()
+    except:
+        pass
 
-    url = sys.argv[1]
+    try:
+        price_text = await extract_price_from_page(page)
+        if price_text:
+            results['price'] = price_text
+            results['price_clean'] = clean_number(price_text)
+            results['price_source'] = "page"
+    except:
+        pass
+
+    try:
+        start_lbl = page.get_by_text("Дата начала исполнения контракта").first
+        if await start_lbl.count() > 0:
+            results['date_start'] = await start_lbl.locator("xpath=following-sibling::span|following-sibling::div").first.inner_text()
+
+        end_lbl = page.get_by_text("Дата окончания исполнения контракта").first
+        if await end_lbl.count() > 0:
+            results['date_end'] = await end_lbl.locator("xpath=following-sibling::span|following-sibling::div").first.inner_text()
+    except:
+        pass
+
+
+async def fetch_objects(page, results, requisites_raw_blocks, url=None):
+    try:
+        if not await open_tab(page, "a[href*='payment-info-and-target-of-order']", "Информация о контракте", url):
+            return
+
+        await wait_for_ready(page, OBJECTS_READY_SELECTOR)
+
+        # All cell texts in one browser round trip
+        all_rows = await page.locator(".tableBlock tbody tr").evaluate_all(ROW_CELLS_JS)
+
+        for row_texts in all_rows:
+            if len(row_texts) >= 5:
+                name = row_texts[1].replace('\n', ' ').strip()
+                price_val = row_texts[4].strip()
+                total_val = row_texts[6].strip() if len(row_texts) > 6 else "0"
+
+                if is_requisite_row(name, price_val, total_val):
+                    requisites_raw_blocks.append(f"{name} {price_val} {total_val}")
+                    continue
+
+                category = detect_category(name)
+                results['objects'].append({
+                    "name": name,
+                    "category": category,
+                    "price": price_val,
+                    "total": total_val
+                })
+                # Summed while parsing; kept out of the objects so objects_hash is unchanged
+                results["objects_total_clean"] += clean_number(total_val)
+    except:
+        pass
+
+
+async def fetch_execution(page, results, url=None):
+    try:
+        if not await open_tab(page, "a[href*='process-info']", "Исполнение", url):
+            return
+
+        await wait_for_ready(page, EXECUTION_READY_SELECTOR)
+
+        paid_lbl = page.get_by_text("Фактически оплачено").first
+        if await paid_lbl.count() > 0:
+            val = await paid_lbl.locator("xpath=..").inner_text()
+            val = val.replace("Фактически оплачено", "").replace("₽", "").strip()
+            results['execution']['paid'] = val
+
+        done_lbl = page.get_by_text("Стоимость исполненных обязательств").first
+        if await done_lbl.count() > 0:
+            val = await done_lbl.locator("xpath=..").inner_text()
+            val = val.replace("Стоимость исполненных обязательств", "").replace("₽", "").strip()
+            results['execution']['accepted'] = val
+    except:
+        pass
+
+
+async def fetch_tabs(obj_page, exec_page, reestr, results, requisites_raw_blocks):
+    """
+    Loads the objects and execution tabs in parallel from URLs built from the reestr number.
+    """
+    await asyncio.gather(
+        fetch_objects(
+            obj_page, results, requisites_raw_blocks,
+            CONTRACT_CARD_URL.format(tab="payment-info-and-target-of-order", reestr=reestr)
+        ),
+        fetch_execution(exec_page, results, CONTRACT_CARD_URL.format(tab="process-info", reestr=reestr)),
+    )
+
+
+async def scrape(context, url):
+    """
+    Scrapes one contract card in fresh pages of the given browser context.
+    Raises if the common-info page cannot be loaded.
+    """
+    reestr_match = _RE_REESTR.search(url) if 'contractCard' in url else None
     # Normalize URL
-    if 'reestrNumber=' in url and 'contractCard' in url and 'common-info' not in url:
-        reestr_match = re.search(r'reestrNumber=(\d+)', url)
-        if reestr_match:
-            url = f"https://zakupki.gov.ru/epz/contract/contractCard/common-info.html?reestrNumber={reestr_match.group(1)}"
+    if reestr_match and 'common-info' not in url:
+        url = CONTRACT_CARD_URL.format(tab="common-info", reestr=reestr_match.group(1))
 
     results = {
         "reestr_number": "",
@@ -197,159 +366,98 @@ async def main():
     }
 
     requisites_raw_blocks = []
+    pages = []
+
+    try:
+        if reestr_match:
+            # Tab URLs are known up front: load all three in parallel tabs
+            reestr = reestr_match.group(1)
+            pages = await asyncio.gather(context.new_page(), context.new_page(), context.new_page())
+            info_page, obj_page, exec_page = pages
+            await asyncio.gather(
+                fetch_common_info(info_page, url, results),
+                fetch_tabs(obj_page, exec_page, reestr, results, requisites_raw_blocks),
+            )
+        else:
+            page = await context.new_page()
+            pages = [page]
+            await fetch_common_info(page, url, results)
+            reestr = results['reestr_number']
+            if reestr:
+                # Reestr number came from the redirected URL: build the tab URLs, skip link discovery
+                pages.append(await context.new_page())
+                await fetch_tabs(page, pages[1], reestr, results, requisites_raw_blocks)
+            else:
+                await fetch_objects(page, results, requisites_raw_blocks)
+                await fetch_execution(page, results)
+    finally:
+        for page in pages:
+            await page.close()
+
+    # Fallback from objects totals
+    objects_total = results["objects_total_clean"]
+
+    if results.get("price_clean", 0.0) <= 0 and objects_total > 0:
+        results["price"] = f"{objects_total:.2f}"
+        results["price_clean"] = objects_total
+        results["price_source"] = "objects_sum"
+        logging.info(f"Price calculated from objects: {objects_total}")
+
+    # Extract requisites
+    results["requisites"] = extract_requisites(requisites_raw_blocks)
+
+    # Hashes for change monitoring
+    results["objects_hash"] = stable_hash(results["objects"])
+    results["requisites_hash"] = stable_hash(results["requisites"])
+
+    return results
+
+
+async def scrape_and_emit(context, url):
+    try:
+        emit(await scrape(context, url))
+    except Exception as e:
+        emit({"error": str(e)})
+
+
+async def main():
+    """
+    Usage: ussr_fetch_contract_data.py <url>
+           ussr_fetch_contract_data.py --stdin   (one URL per line, one JSON line per URL)
+    The --stdin worker keeps one browser alive for the whole batch.
+    """
+    if len(sys.argv) < 2:
+        emit({"error": "No URL provided"})
+        sys.exit(1)
+
+    # Deferred so importing the parsing helpers does not load Playwright
+    from playwright.async_api import async_playwright
+    from browser_pool import block_heavy_resources, USER_AGENT
 
     async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-        )
-        page = await context.new_page()
+        browser = await p.chromium.launch(headless=True, args=BROWSER_ARGS)
+        context = await browser.new_context(user_agent=USER_AGENT)
+        await block_heavy_resources(context, BLOCKED_RESOURCE_TYPES)
 
         try:
-            # 1. Common Info
-            await page.goto(url, timeout=60000, wait_until="domcontentloaded")
-
-            try:
-                match = re.search(r'reestrNumber=(\d+)', page.url)
-                if match:
-                    results['reestr_number'] = match.group(1)
-            except:
-                pass
-
-            try:
-                customer_el = page.locator("a[href*='organization']").first
-                if await customer_el.count() > 0:
-                    results['customer'] = await customer_el.inner_text()
-                else:
-                    lbl = page.get_by_text("Заказчик", exact=False).first
-                    if await lbl.count() > 0:
-                        results['customer'] = await lbl.locator("..").inner_text()
-            except:
-                pass
-
-            try:
-                price_text = await extract_price_from_page(page)
-                if price_text:
-                    results['price'] = price_text
-                    results['price_clean'] = clean_number(price_text)
-                    results['price_source'] = "page"
-            except:
-                pass
-
-            try:
-                start_lbl = page.get_by_text("Дата начала исполнения контракта").first
-                if await start_lbl.count() > 0:
-                    results['date_start'] = await start_lbl.locator("xpath=following-sibling::span|following-sibling::div").first.inner_text()
-
-                end_lbl = page.get_by_text("Дата окончания исполнения контракта").first
-                if await end_lbl.count() > 0:
-                    results['date_end'] = await end_lbl.locator("xpath=following-sibling::span|following-sibling::div").first.inner_text()
-            except:
-                pass
-
-            # 2. Objects
-            try:
-                obj_tab = page.locator("a[href*='payment-info-and-target-of-order']").first
-                if await obj_tab.count() == 0:
-                    obj_tab = page.get_by_text("Информация о контракте").first
-
-                if await obj_tab.count() > 0:
-                    href = await obj_tab.get_attribute("href")
-                    if href:
-                        if not href.startswith("http"):
-                            href = "https://zakupki.gov.ru" + href
-                        await page.goto(href, wait_until="domcontentloaded")
-                    else:
-                        await obj_tab.click()
-                        await page.wait_for_load_state("domcontentloaded")
-
-                    await page.wait_for_timeout(2000)
-
-                    rows = page.locator(".tableBlock tbody tr")
-                    count = await rows.count()
-
-                    for i in range(count):
-                        row = rows.nth(i)
-                        cells = row.locator("td")
-                        if await cells.count() > 3:
-                            row_texts = await cells.all_inner_texts()
-                            if len(row_texts) >= 5:
-                                name = row_texts[1].replace('\n', ' ').strip()
-                                price_val = row_texts[4].strip() if len(row_texts) > 4 else "0"
-                                total_val = row_texts[6].strip() if len(row_texts) > 6 else "0"
-
-                                if is_requisite_row(name, price_val, total_val):
-                                    requisites_raw_blocks.append(" ".join([name, price_val, total_val]))
-                                    continue
-
-                                category = detect_category(name)
-                                results['objects'].append({
-                                    "name": name,
-                                    "category": category,
-                                    "price": price_val,
-                                    "total": total_val
-                                })
-            except:
-                pass
-
-            # 3. Execution
-            try:
-                exec_tab = page.locator("a[href*='process-info']").first
-                if await exec_tab.count() == 0:
-                    exec_tab = page.get_by_text("Исполнение").first
-
-                if await exec_tab.count() > 0:
-                    href = await exec_tab.get_attribute("href")
-                    if href:
-                        if not href.startswith("http"):
-                            href = "https://zakupki.gov.ru" + href
-                        await page.goto(href, wait_until="domcontentloaded")
-                    else:
-                        await exec_tab.click()
-                        await page.wait_for_load_state("domcontentloaded")
-
-                    await page.wait_for_timeout(2000)
-
-                    paid_lbl = page.get_by_text("Фактически оплачено").first
-                    if await paid_lbl.count() > 0:
-                        val = await paid_lbl.locator("xpath=..").inner_text()
-                        val = val.replace("Фактически оплачено", "").replace("₽", "").strip()
-                        results['execution']['paid'] = val
-
-                    done_lbl = page.get_by_text("Стоимость исполненных обязательств").first
-                    if await done_lbl.count() > 0:
-                        val = await done_lbl.locator("xpath=..").inner_text()
-                        val = val.replace("Стоимость исполненных обязательств", "").replace("₽", "").strip()
-                        results['execution']['accepted'] = val
-            except:
-                pass
-
-            # Fallback from objects totals
-            objects_total = 0.0
-            for obj in results.get("objects", []):
-                objects_total += clean_number(obj.get("total", ""))
-            results["objects_total_clean"] = objects_total
-
-            if results.get("price_clean", 0.0) <= 0 and objects_total > 0:
-                results["price"] = f"{objects_total:.2f}"
-                results["price_clean"] = objects_total
-                results["price_source"] = "objects_sum"
-                logging.info(f"Price calculated from objects: {objects_total}")
-
-            # Extract requisites
-            results["requisites"] = extract_requisites(requisites_raw_blocks)
-
-            # Hashes for change monitoring
-            results["objects_hash"] = stable_hash(results["objects"])
-            results["requisites_hash"] = stable_hash(results["requisites"])
-
-            print(json.dumps(results, ensure_ascii=False))
-
-        except Exception as e:
-            print(json.dumps({"error": str(e)}))
+            if sys.argv[1] == "--stdin":
+                while True:
+                    line = await asyncio.to_thread(sys.stdin.readline)
+                    if not line:
+                        break
+                    url = line.strip()
+                    if url:
+                        await scrape_and_emit(context, url)
+            else:
+                await scrape_and_emit(context, sys.argv[1])
         finally:
             await browser.close()
 
 
 if __name__ == '__main__':
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    except ImportError:
+        pass
     asyncio.run(main())